@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+คำนวณเวลารอก่อนถามงานครั้งถัดไปของ controller.py
+
+ลำดับความสำคัญ:
+1. server สั่งชะลอ (429/503 + Retry-After) -> ไม่ถามก่อนเวลานั้นเด็ดขาด
+2. server ส่ง next_poll_seconds มา -> ใช้ค่านั้น
+3. ไม่มี hint (server รุ่นเก่า/ต่อไม่ได้) -> ถามถี่หลังเพิ่งมีงาน, เงียบนานหรือ error ติดกันให้ห่างขึ้นเท่าตัว
+ทุกกรณีบวก/ลบ jitter เพื่อไม่ให้ Pi ทุกตัวยิงพร้อมกัน
+"""
+
+import random
+import time
+
+
+class PollScheduler:
+    def __init__(self, base_interval=5.0, fast_interval=2.0, max_interval=60.0,
+                 active_window=120.0, jitter=0.2, min_interval=1.0):
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.active_window = active_window
+        self.jitter = jitter
+        self.min_interval = min_interval
+
+        self.last_job_at = None
+        self.idle_polls = 0
+        self.errors = 0
+        self.hint = None
+        self.retry_after = None
+
+    def on_response(self, has_job, hint=None):
+        """server ตอบปกติ"""
+        self.errors = 0
+        self.retry_after = None
+        self.hint = hint
+        if has_job:
+            self.last_job_at = time.monotonic()
+            self.idle_polls = 0
+        else:
+            self.idle_polls += 1
+
+    def on_throttled(self, retry_after):
+        """server ตอบ 429/503 พร้อม Retry-After (วินาที)"""
+        self.hint = None
+        self.retry_after = retry_after
+
+    def on_error(self):
+        """ต่อ server ไม่ได้ หรือได้ status ที่ไม่คาดไว้"""
+        self.errors += 1
+        self.hint = None
+        self.retry_after = None
+
+    def _backoff(self, exponent):
+        return min(self.max_interval, self.base_interval * 2 ** exponent)
+
+    def next_delay(self):
+        """วินาทีที่ควรรอก่อนถามงานครั้งถัดไป"""
+        if self.errors:
+            delay = self._backoff(self.errors - 1)
+        elif self.hint is not None:
+            delay = self.hint
+        elif self.last_job_at is not None and time.monotonic() - self.last_job_at <= self.active_window:
+            delay = self.fast_interval
+        else:
+            delay = self._backoff(max(0, self.idle_polls - 1))
+
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        floor = max(self.min_interval, self.retry_after or 0)
+        return max(floor, delay)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark รอบงานยกยอ (execute_lift_job) แบบ end-to-end บน Linux ทั่วไป/CI
+
+- ใช้ฮาร์ดแวร์จำลองจาก hardware.py (SHRIMP_HW=sim)
+- เปิด HTTP server จำลองในเครื่อง แทน cloud_app, frontend pond-status และ backend /process
+- แตกเวลาเป็นช่วง ๆ จาก timings ที่ controller แนบมากับ complete_job (ดู job_timing.py)
+
+ตัวอย่าง:
+    python bench_job.py --runs 5
+    python bench_job.py --runs 3 --time-scale 0.1 --json bench_output.json
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("SHRIMP_HW", "sim")
+os.environ.setdefault("SHRIMP_SIM_CAMERAS", "0")
+
+# ช่วงที่วัดจากฝั่ง server จำลอง: (ชื่อ, event เริ่ม, event จบ)
+# ช่วงภายใน execute_lift_job มาจาก result_data["timings"] ที่ controller ส่งตอน complete_job
+OUTER_PHASES = [
+    ("poll", "start", "polled"),
+    ("complete", "status_5", "completed"),
+    ("total", "start", "completed"),
+]
+
+
+# === STAND-IN SERVER ===
+class StandInState:
+    """เก็บ event ที่ server จำลองได้รับ (เวลาเป็น time.monotonic())"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.uploaded_bytes = 0
+        self.completions = []
+
+    def record(self, name, **extra):
+        with self.lock:
+            self.events.append((name, time.monotonic(), extra))
+
+    def reset(self):
+        with self.lock:
+            self.events = []
+            self.uploaded_bytes = 0
+            self.completions = []
+
+
+def make_handler(state, pond_id):
+    job = {"pond_id": pond_id, "action": "lift_up", "status": "pending"}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _reply(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/job"):
+                return self._reply({"has_job": True, "job_data": job, "message": "bench"})
+            self._reply({"detail": "not found"}, 404)
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path == "/heartbeat":
+                return self._reply({"success": True, "has_job": True, "job_data": job})
+            if self.path.startswith("/api/pond-status/"):
+                status = json.loads(body or b"{}").get("status")
+                state.record(f"status_{status}")
+                return self._reply({"success": True})
+            if self.path == "/process":
+                with state.lock:
+                    state.uploaded_bytes += len(body)
+                return self._reply({"success": True, "bench": True})
+            if self.path.startswith("/media/"):
+                if not body:
+                    return self._reply({"detail": "ยังไม่มีไฟล์นี้"}, 404)
+                with state.lock:
+                    state.uploaded_bytes += len(body)
+                return self._reply({"success": True, "duplicate": False, "size": len(body), "url": "/media/bench"})
+            if self.path.endswith("/complete"):
+                with state.lock:
+                    state.completions.append(json.loads(body or b"{}"))
+                return self._reply({"success": True})
+            self._reply({"detail": "not found"}, 404)
+
+    return Handler
+
+
+def start_stand_in_server(state, pond_id):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state, pond_id))
+    threading.Thread(target=server.serve_forever, name="stand-in-server", daemon=True).start()
+    return server
+
+
+# === CONTROLLER SETUP ===
+class ScaledTime:
+    """แทน module time ใน controller เพื่อย่นเวลา time.sleep() ที่ fix ไว้ (เช่น รอ relay, ยกยอลง)"""
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def sleep(self, seconds):
+        time.sleep(seconds * self.scale)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def load_controller(base_url, media_dir, time_scale):
+    import controller
+    controller.CLOUD_API_URL = base_url
+    controller.FRONT_API_URL = base_url
+    controller.BACKEND_URL = f"{base_url}/process"
+    controller.MEDIA_DIR = media_dir
+    if time_scale != 1.0:
+        controller.time = ScaledTime(time_scale)
+    return controller
+
+
+# === BENCHMARK ===
+def run_once(controller, state):
+    state.reset()
+    # --time-scale ย่นเวลายกยอลงแต่ยอจำลองเคลื่อนที่ตามเวลาจริง: วางยอกลับที่ลงสุดทุกรอบ
+    # เพื่อให้ช่วง lift ของทุกรอบเทียบกันได้
+    for switch in getattr(controller.gpio(), "switches", []):
+        switch.reset()
+    state.record("start")
+    has_job, job_data = controller.check_for_job()
+    state.record("polled")
+    if not has_job:
+        raise RuntimeError("stand-in server ไม่ได้ส่งงานกลับมา")
+    result = controller.execute_lift_job(job_data)
+    controller.complete_job(result)
+    state.record("completed")
+
+    marks = {}
+    for name, at, _ in state.events:
+        marks.setdefault(name, at)
+
+    job_timings = (state.completions[-1].get("timings") or {}) if state.completions else {}
+    phases = {"poll": None}
+    phases.update(job_timings.get("phases") or {})
+    for phase, begin, end in OUTER_PHASES:
+        if begin in marks and end in marks:
+            phases[phase] = marks[end] - marks[begin]
+    phases = {phase: seconds for phase, seconds in phases.items() if seconds is not None}
+    return {
+        "status": result.get("status"),
+        "error": result.get("error"),
+        "uploaded_bytes": state.uploaded_bytes,
+        "recording": result.get("recording"),
+        "phases": phases
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(runs):
+    summary = {}
+    names = []
+    for run in runs:
+        names.extend(phase for phase in run["phases"] if phase not in names)
+    names.sort(key=lambda phase: phase == "total")
+    for phase in names:
+        values = [run["phases"][phase] for run in runs if phase in run["phases"]]
+        summary[phase] = {
+            "count": len(values),
+            "mean": statistics.mean(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values)
+        }
+    return summary
+
+
+def print_report(summary, runs):
+    print()
+    print(f"{'phase':<26}{'n':>4}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+    for phase, st in summary.items():
+        print(f"{phase:<26}{st['count']:>4}{st['mean']:>10.3f}{st['p50']:>10.3f}{st['p95']:>10.3f}{st['max']:>10.3f}")
+    uploaded = [run["uploaded_bytes"] for run in runs]
+    print(f"\nuploaded bytes/job: mean {statistics.mean(uploaded):.0f}, max {max(uploaded)}")
+    recordings = [run["recording"] for run in runs if run.get("recording")]
+    if recordings:
+        stops = collections.Counter(rec["stop_reason"] for rec in recordings)
+        print(f"recording: mean {statistics.mean(rec['duration'] for rec in recordings):.2f} s, "
+              f"frames written/read {sum(rec['frames_written'] for rec in recordings)}"
+              f"/{sum(rec['frames_read'] for rec in recordings)}, stop {dict(stops)}")
+    failed = [run for run in runs if run["status"] != "success"]
+    if failed:
+        print(f"⚠️ {len(failed)} รอบล้มเหลว: {failed[0]['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark execute_lift_job ด้วยฮาร์ดแวร์จำลอง")
+    parser.add_argument("--runs", type=int, default=3, help="จำนวนรอบงาน")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="คูณเวลา time.sleep() ใน controller (เช่น 0.1 = เร็วขึ้น 10 เท่า)")
+    parser.add_argument("--json", help="บันทึกผลแบบ JSON ลงไฟล์นี้")
+    args = parser.parse_args(argv)
+
+    state = StandInState()
+    with tempfile.TemporaryDirectory(prefix="shrimp_bench_") as media_dir:
+        server = start_stand_in_server(state, pond_id=1)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        controller = load_controller(base_url, media_dir, args.time_scale)
+
+        runs = []
+        try:
+            for i in range(args.runs):
+                runs.append(run_once(controller, state))
+                print(f"รอบที่ {i + 1}/{args.runs}: {runs[-1]['phases'].get('total', 0):.2f} s ({runs[-1]['status']})")
+        finally:
+            server.shutdown()
+
+    summary = summarize(runs)
+    print_report(summary, runs)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "runs": runs, "time_scale": args.time_scale}, f, indent=2)
+
+    return 0 if all(run["status"] == "success" for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
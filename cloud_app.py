@@ -1,11 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Set
+from collections import deque, OrderedDict
 import uvicorn
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import asyncio
 import json
+import hashlib
+import itertools
+import math
+import mimetypes
 import os
+import random
+import re
+import tempfile
+import time
+import uuid
 
 app = FastAPI(title="Shrimp Farm Cloud Controller", version="1.0.0")
 
@@ -29,16 +41,812 @@ class CamSideCommand(BaseModel):
     action: str = "cam_side"
     timestamp: Optional[str] = None
 
+class Command(BaseModel):
+    pondId: str  # frontend ส่งมาเป็น string
+    action: str
+    timestamp: Optional[str] = None
+
 class JobResponse(BaseModel):
     has_job: bool
     job_data: Optional[Dict[str, Any]] = None
     message: str
+    next_poll_seconds: Optional[float] = None  # Pi ควรถามงานครั้งถัดไปในอีกกี่วินาที
+    waiting_reason: Optional[str] = None       # มีงานแต่ยังส่งให้ไม่ได้ (ติด admission control)
+
+class Heartbeat(BaseModel):
+    device_id: str
+    pond_id: int
+    device_type: str = "RSPI1"  # RSPI1 = ยกยอ, RSPI2 = cam_side
+    capabilities: Optional[List[str]] = None  # ไม่ส่งมา = ใช้ค่าตาม device_type
+    status: str = "online"
+    readiness: Optional[Dict[str, Any]] = None  # สถานะเริ่มระบบของ controller (ดู startup.py)
+    timestamp: Optional[str] = None
+
+class DeviceRegistration(BaseModel):
+    device_id: str
+    pond_id: int
+    device_type: str = "RSPI1"
+    capabilities: Optional[List[str]] = None
+
+class ScheduleRequest(BaseModel):
+    cron: str                       # เช่น "0 6,18 * * *" = ทุกวัน 06:00 และ 18:00
+    action: str = "lift_up"
+    pond_ids: List[int] = []
+    groups: List[str] = []          # ชื่อกลุ่มบ่อ (PUT /pond-groups/{name})
+    name: Optional[str] = None
+    spacing_seconds: float = 0.0    # ระยะห่างระหว่างบ่อในรอบเดียวกัน
+    jitter_seconds: float = 60.0    # สุ่มเลื่อนเวลาแต่ละบ่อเพิ่ม 0..jitter_seconds
+    enabled: bool = True
+
+class PondGroup(BaseModel):
+    pond_ids: List[int]
 
 # === IN-MEMORY STORAGE ===
 # ใน production ควรใช้ database แทน
-pending_jobs: Dict[int, Dict[str, Any]] = {}
-pending_job_RSPI2: Dict[int, Dict[str, Any]] = {}
-completed_jobs: Dict[int, Dict[str, Any]] = {}
+completed_jobs: Dict[int, Dict[str, Any]] = {}  # pond_id -> งานที่เสร็จล่าสุด
+
+# === DEVICE REGISTRY ===
+# อุปกรณ์แต่ละตัวประกาศบ่อและความสามารถ (capability) ของตัวเอง
+# คำสั่งถูกส่งเข้าคิวตาม (pond_id, capability) ที่ action นั้นต้องใช้
+# อุปกรณ์ตัวไหนก็ได้ในบ่อเดียวกันที่มี capability นั้นจะได้งานไป (lookup เป็น O(1) ต่อ capability)
+DEVICE_TYPE_CAPABILITIES: Dict[str, List[str]] = {
+    "RSPI1": ["lift", "camera"],
+    "RSPI2": ["side_camera"],
+}
+ACTION_CAPABILITY: Dict[str, str] = {
+    "lift_up": "lift",
+    "lift_down": "lift",
+    "lift": "lift",
+    "cam_side": "side_camera",
+}
+ACTION_LABELS: Dict[str, str] = {
+    "lift_up": "ยกยอขึ้น",
+    "lift_down": "ยกยอลง",
+    "lift": "ยกเชือก",
+    "cam_side": "ถ่ายภาพด้านข้าง",
+}
+
+devices: Dict[str, Dict[str, Any]] = {}                    # device_id -> ข้อมูลอุปกรณ์
+capability_index: Dict[Tuple[int, str], Set[str]] = {}     # (pond_id, capability) -> device_ids
+job_queues: Dict[Tuple[int, str], deque] = {}              # (pond_id, capability) -> งานที่รอ
+pending_jobs_by_id: Dict[int, Dict[str, Any]] = {}         # job id -> งานที่ยังอยู่ในคิว
+job_ids = itertools.count(1)
+
+# ตัวนับที่อัปเดตทีละรายการ (ไม่ต้องไล่ทุกคิวตอนเรียก /status)
+pending_counts: Dict[str, int] = {}            # capability -> จำนวนงานที่รอ
+pending_pond_sets: Dict[str, Set[int]] = {}    # capability -> บ่อที่มีงานรอ
+# เวอร์ชันข้อมูล ใช้ทำ ETag: เพิ่มทุกครั้งที่คิว/งาน/อุปกรณ์ของบ่อนั้นเปลี่ยน
+# Pi ที่ถามซ้ำโดยไม่มีอะไรเปลี่ยนจะได้ 304 ว่าง ๆ กลับไป
+pond_versions: Dict[int, int] = {}
+versions = {"state": 0, "admission": 0}       # state = ทั้งระบบ (/status), admission = lease/ขีดจำกัดเปลี่ยน
+
+def touch_pond(pond_id: int):
+    pond_versions[pond_id] = pond_versions.get(pond_id, 0) + 1
+    versions["state"] += 1
+
+def device_capabilities(device_type: str, capabilities: Optional[List[str]] = None) -> List[str]:
+    if capabilities:
+        return sorted(set(capabilities))
+    return list(DEVICE_TYPE_CAPABILITIES.get(device_type, []))
+
+def register_device(device_id: str, pond_id: int, device_type: str,
+                    capabilities: Optional[List[str]] = None) -> Dict[str, Any]:
+    """ลงทะเบียน/อัปเดตอุปกรณ์ (เรียกซ้ำทุก heartbeat ได้ ถ้าไม่มีอะไรเปลี่ยนจะไม่แตะ index)"""
+    caps = device_capabilities(device_type, capabilities)
+    device = devices.get(device_id)
+    if device is not None:
+        if device["pond_id"] == pond_id and device["device_type"] == device_type and device["capabilities"] == caps:
+            return device
+        for cap in device["capabilities"]:
+            capability_index.get((device["pond_id"], cap), set()).discard(device_id)
+        touch_pond(device["pond_id"])
+
+    device = {
+        "device_id": device_id,
+        "pond_id": pond_id,
+        "device_type": device_type,
+        "capabilities": caps,
+        "registered_at": datetime.now().isoformat()
+    }
+    devices[device_id] = device
+    for cap in caps:
+        capability_index.setdefault((pond_id, cap), set()).add(device_id)
+    touch_pond(pond_id)
+    return device
+
+def enqueue_job(pond_id: int, action: str, timestamp: str) -> Dict[str, Any]:
+    capability = ACTION_CAPABILITY.get(action)
+    if capability is None:
+        raise HTTPException(status_code=400, detail=f"ไม่รู้จัก action: {action}")
+    job = {
+        "id": next(job_ids),
+        "pond_id": pond_id,
+        "action": action,
+        "capability": capability,
+        "timestamp": timestamp,
+        "created_at": datetime.now().isoformat(),
+        "status": "pending"
+    }
+    job_queues.setdefault((pond_id, capability), deque()).append(job)
+    pending_jobs_by_id[job["id"]] = job
+    job_enqueued_at[job["id"]] = time.monotonic()
+    pending_counts[capability] = pending_counts.get(capability, 0) + 1
+    pending_pond_sets.setdefault(capability, set()).add(pond_id)
+    touch_pond(pond_id)
+    mark_pond_activity(pond_id)
+    return job
+
+def find_pending_job(pond_id: int, action: str) -> Optional[Dict[str, Any]]:
+    """งาน action เดียวกันที่ยังค้างอยู่ในคิวของบ่อนี้ (None ถ้าไม่มี)"""
+    queue = job_queues.get((pond_id, ACTION_CAPABILITY.get(action)), ())
+    return next((job for job in queue if job["action"] == action), None)
+
+def finish_job(pond_id: int, capabilities: List[str], result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """เอางานที่ทำเสร็จออกจากคิวแล้วย้ายไป completed_jobs"""
+    job_id = result.get("job_id")
+    for cap in capabilities:
+        key = (pond_id, cap)
+        queue = job_queues.get(key)
+        if not queue or (job_id is not None and queue[0]["id"] != job_id):
+            continue
+        job = queue.popleft()
+        pending_counts[cap] -= 1
+        if not queue:
+            del job_queues[key]
+            pending_pond_sets[cap].discard(pond_id)
+        release_lease(job["id"])
+        pending_jobs_by_id.pop(job["id"], None)
+        job_enqueued_at.pop(job["id"], None)
+        job["status"] = "completed"
+        job["completed_at"] = datetime.now().isoformat()
+        job["result"] = result
+        completed_jobs[pond_id] = job
+        record_job_timings(pond_id, result)
+        touch_pond(pond_id)
+        mark_pond_activity(pond_id)
+        return job
+    return None
+
+def pending_ponds(capabilities: List[str]) -> List[int]:
+    """บ่อที่มีงานค้างสำหรับ capability ใดก็ได้ในรายการ"""
+    return sorted(set().union(*(pending_pond_sets.get(cap, ()) for cap in capabilities)))
+
+# === DEVICE LIVENESS ===
+# device_id -> ข้อมูล heartbeat ล่าสุด (last_seen เป็น time.monotonic())
+device_last_seen: Dict[str, Dict[str, Any]] = {}
+ONLINE_WINDOW = 15   # วินาที: เห็น heartbeat ภายในช่วงนี้ = online
+STALE_WINDOW = 60    # วินาที: เกิน ONLINE_WINDOW แต่ไม่เกินนี้ = stale, เกินกว่านี้ = offline
+
+# === IDEMPOTENCY ===
+# client ส่ง header Idempotency-Key มา ถ้าส่งซ้ำด้วย key เดิม (เช่น retry หลัง timeout)
+# จะได้ response เดิมกลับไปโดยไม่สร้างงาน/บันทึกงานซ้ำ
+IDEMPOTENCY_TTL = 24 * 60 * 60   # วินาที
+IDEMPOTENCY_MAX_ENTRIES = 10000
+
+class IdempotencyCache:
+    """cache response ล่าสุดตาม (scope, key) แบบมีอายุและจำกัดจำนวน (LRU)"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _evict(self, now: float):
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if entry["expires_at"] > now and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+
+    def lookup(self, scope: str, key: Optional[str], payload: Any) -> Optional[Dict[str, Any]]:
+        """response เดิมถ้าเคยเห็น key นี้แล้ว (409 ถ้า key เดิมแต่ข้อมูลไม่ตรงกัน)"""
+        if not key:
+            return None
+        now = time.monotonic()
+        self._evict(now)
+        entry = self.entries.get((scope, key))
+        if entry is None:
+            return None
+        if entry["expires_at"] <= now:
+            del self.entries[(scope, key)]
+            return None
+        if entry["fingerprint"] != self.fingerprint(payload):
+            raise HTTPException(status_code=409, detail="Idempotency-Key นี้ถูกใช้กับข้อมูลอื่นไปแล้ว")
+        self.entries.move_to_end((scope, key))
+        return entry["response"]
+
+    def store(self, scope: str, key: Optional[str], payload: Any, response: Dict[str, Any]):
+        if not key:
+            return
+        now = time.monotonic()
+        self.entries[(scope, key)] = {
+            "fingerprint": self.fingerprint(payload),
+            "response": response,
+            "expires_at": now + self.ttl
+        }
+        self.entries.move_to_end((scope, key))
+        self._evict(now)
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_ENTRIES)
+
+# === JOB TIMINGS ===
+# pond_id -> phase -> เวลาล่าสุด (วินาที) สูงสุด TIMING_SAMPLES_PER_PHASE ค่า (เฉพาะงานที่สำเร็จ)
+job_timings: Dict[int, Dict[str, deque]] = {}
+# งานที่ล้มเหลวแยกไว้ต่างหาก ไม่ให้ดึง percentile/bottleneck ของงานปกติ:
+# pond_id -> failed_phase -> เวลารวมตั้งแต่เริ่มงานจนล้มเหลว (วินาที)
+failed_job_timings: Dict[int, Dict[str, deque]] = {}
+TIMING_SAMPLES_PER_PHASE = 500
+
+def record_job_timings(pond_id: int, result: Dict[str, Any]):
+    """เก็บเวลาแต่ละช่วงจาก result["timings"] ที่ Pi ส่งมา"""
+    timings = result.get("timings")
+    if not isinstance(timings, dict):
+        return
+    if result.get("status") != "success" or timings.get("failed_phase"):
+        total = timings.get("total")
+        if isinstance(total, (int, float)):
+            failed_phase = timings.get("failed_phase") or "unknown"
+            failed_job_timings.setdefault(pond_id, {}).setdefault(
+                failed_phase, deque(maxlen=TIMING_SAMPLES_PER_PHASE)).append(float(total))
+        return
+
+    samples = dict(timings.get("phases") or {})
+    if "total" in timings:
+        samples["total"] = timings["total"]
+
+    pond_timings = job_timings.setdefault(pond_id, {})
+    for phase, seconds in samples.items():
+        if isinstance(seconds, (int, float)):
+            pond_timings.setdefault(phase, deque(maxlen=TIMING_SAMPLES_PER_PHASE)).append(float(seconds))
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """nearest-rank percentile ของ list ที่เรียงแล้ว"""
+    index = max(0, min(len(ordered) - 1, math.ceil(len(ordered) * pct / 100) - 1))
+    return ordered[index]
+
+def summarize_timings(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1]
+    }
+
+def device_state(entry: Dict[str, Any], now: float, busy: bool = False) -> str:
+    """จัดสถานะอุปกรณ์จากเวลาที่เห็นล่าสุด (เผื่อเวลาตาม next_poll ที่สั่งให้อุปกรณ์นั้นไว้)
+
+    busy: อุปกรณ์ถือ lease ของงานอยู่ ระหว่างทำงาน Pi ไม่ได้ส่ง heartbeat จึงนับเป็น online
+    จนกว่าจะแจ้งงานเสร็จหรือ lease หมดอายุ
+    """
+    if busy:
+        return "online"
+    age = now - entry["last_seen"]
+    expected = entry.get("next_poll_seconds") or 0
+    if age <= ONLINE_WINDOW + expected:
+        return "online"
+    if age <= STALE_WINDOW + expected:
+        return "stale"
+    return "offline"
+
+# === ADMISSION CONTROL ===
+# จำกัดจำนวนงานที่กำลังทำพร้อมกัน (ยกยอ + อัปโหลด) ทั้ง fleet และแยกตาม device_type
+# เพื่อไม่ให้ backend ประมวลผลรับวิดีโอพร้อมกันเกินกำลัง
+# - งานที่ส่งให้อุปกรณ์แล้วถือ lease ไว้ JOB_LEASE_SECONDS วินาที (คืนเมื่อแจ้งงานเสร็จ)
+# - เกินขีดจำกัด -> งานรออยู่ในคิว อุปกรณ์ได้ has_job=False จนกว่าจะมีงานเสร็จหรือ lease หมดอายุ
+# - lease หมดอายุ (เช่น Pi ดับกลางงาน) -> งานกลับเป็น pending ให้อุปกรณ์ถัดไปรับ
+# ตั้งค่าด้วย env ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_INFLIGHT_BY_TYPE (เช่น "RSPI1=8,RSPI2=4")
+# หรือ PUT /admission ระหว่างรัน
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 300))
+
+def parse_type_limits(text: str) -> Dict[str, int]:
+    limits = {}
+    for part in text.split(","):
+        if "=" in part:
+            device_type, limit = part.split("=", 1)
+            limits[device_type.strip()] = int(limit)
+    return limits
+
+admission_limits: Dict[str, Any] = {
+    "max_inflight": int(os.environ.get("ADMISSION_MAX_INFLIGHT", 20)),
+    "max_inflight_by_type": parse_type_limits(os.environ.get("ADMISSION_MAX_INFLIGHT_BY_TYPE", "")),
+}
+inflight_leases: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # job id -> lease (เรียงตามเวลาหมดอายุ)
+inflight_by_type: Dict[str, int] = {}
+job_enqueued_at: Dict[int, float] = {}      # job id -> time.monotonic() ตอนเข้าคิว (ใช้คำนวณเวลารอคิว)
+queue_wait_samples: deque = deque(maxlen=TIMING_SAMPLES_PER_PHASE)
+admission_stats = {"granted": 0, "deferred": 0, "expired": 0}
+
+def release_lease(job_id: int) -> Optional[Dict[str, Any]]:
+    lease = inflight_leases.pop(job_id, None)
+    if lease is not None:
+        inflight_by_type[lease["device_type"]] -= 1
+        versions["admission"] += 1
+        versions["state"] += 1
+    return lease
+
+def expire_leases():
+    """คืน lease ที่หมดอายุ (OrderedDict เรียงตามเวลาหมดอายุ จึงดูแค่ต้นรายการ)"""
+    now = time.monotonic()
+    while inflight_leases:
+        job_id, lease = next(iter(inflight_leases.items()))
+        if lease["expires_at"] > now:
+            break
+        release_lease(job_id)
+        job = lease["job"]
+        if job["status"] == "dispatched":
+            job["status"] = "pending"
+            job.pop("lease_holder", None)
+            job.pop("lease_expires_at", None)
+            touch_pond(job["pond_id"])
+        admission_stats["expired"] += 1
+        print(f"⌛ lease ของงาน {job_id} (บ่อ {job['pond_id']}, {lease['holder']}) หมดอายุ คืนงานเข้าคิว")
+
+def admission_blocked(device_type: str) -> Optional[str]:
+    """เหตุผลที่ยังส่งงานเพิ่มไม่ได้ (None = ส่งได้)"""
+    if len(inflight_leases) >= admission_limits["max_inflight"]:
+        return f"งานที่ทำพร้อมกันทั้งระบบครบ {admission_limits['max_inflight']} งานแล้ว"
+    type_limit = admission_limits["max_inflight_by_type"].get(device_type)
+    if type_limit is not None and inflight_by_type.get(device_type, 0) >= type_limit:
+        return f"งานของ {device_type} ที่ทำพร้อมกันครบ {type_limit} งานแล้ว"
+    return None
+
+def grant_lease(job: Dict[str, Any], device_type: str, holder: str):
+    now = time.monotonic()
+    inflight_leases[job["id"]] = {
+        "job": job,
+        "device_type": device_type,
+        "holder": holder,
+        "expires_at": now + JOB_LEASE_SECONDS
+    }
+    inflight_by_type[device_type] = inflight_by_type.get(device_type, 0) + 1
+    job["status"] = "dispatched"
+    job["lease_holder"] = holder
+    job["lease_expires_at"] = datetime.fromtimestamp(time.time() + JOB_LEASE_SECONDS).isoformat()
+
+    if job["id"] in job_enqueued_at:
+        wait = now - job_enqueued_at.pop(job["id"])
+        job["queue_wait_seconds"] = round(wait, 3)
+        queue_wait_samples.append(wait)
+        job_timings.setdefault(job["pond_id"], {}).setdefault(
+            "queue_wait", deque(maxlen=TIMING_SAMPLES_PER_PHASE)).append(wait)
+    admission_stats["granted"] += 1
+    versions["admission"] += 1
+    touch_pond(job["pond_id"])
+
+def dispatch_job(pond_id: int, capabilities: List[str], device_type: str,
+                 holder: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """งานที่อุปกรณ์นี้รับได้ตอนนี้ คืน (job, None) หรือ (None, เหตุผลที่ต้องรอ ถ้ามีงานแต่ติดขีดจำกัด)"""
+    expire_leases()
+    waiting_reason = None
+    for cap in capabilities:
+        queue = job_queues.get((pond_id, cap))
+        if not queue:
+            continue
+        job = queue[0]
+        lease = inflight_leases.get(job["id"])
+        if lease is not None:
+            if lease["holder"] != holder:
+                waiting_reason = f"งาน {job['id']} กำลังทำโดย {lease['holder']}"
+                continue
+            # อุปกรณ์เดิมถามซ้ำ (เช่น restart กลางงาน) -> ต่ออายุ lease เดิม
+            lease["expires_at"] = time.monotonic() + JOB_LEASE_SECONDS
+            inflight_leases.move_to_end(job["id"])
+            return job, None
+        reason = admission_blocked(device_type)
+        if reason is not None:
+            admission_stats["deferred"] += 1
+            return None, reason
+        grant_lease(job, device_type, holder)
+        return job, None
+    return None, waiting_reason
+
+# === ADAPTIVE POLLING ===
+# server บอก Pi ว่าควรถามงานครั้งถัดไปเมื่อไหร่ (next_poll_seconds):
+# - บ่อที่เพิ่งมีคำสั่ง/งานเสร็จภายใน ACTIVE_WINDOW -> ถามถี่ (POLL_FAST)
+# - บ่อที่เงียบ -> ค่อย ๆ ห่างขึ้นเท่าตัวทุก ๆ ACTIVE_WINDOW จนถึง POLL_IDLE_MAX
+#   (บ่อที่ยังไม่เคยมีกิจกรรม เช่นหลัง restart เริ่มนับเงียบตั้งแต่ถามครั้งแรก ที่ POLL_DEFAULT)
+# - ถ้าทั้ง fleet ถามเกิน POLL_RATE_CAPACITY ครั้ง/วินาที -> ยืดออกตามสัดส่วนโหลด
+# - ถามถี่กว่า POLL_MIN_INTERVAL -> ตอบ 429 + Retry-After
+POLL_FAST = 2.0
+POLL_DEFAULT = 5.0
+POLL_IDLE_MAX = 30.0
+ACTIVE_WINDOW = 300          # วินาที
+POLL_RATE_CAPACITY = 50.0    # ครั้ง/วินาที ทั้ง fleet
+POLL_MIN_INTERVAL = 1.0      # วินาที ต่ออุปกรณ์
+POLL_RATE_WINDOW = 10.0      # วินาที ที่ใช้คำนวณอัตราการถาม
+
+pond_last_activity: Dict[int, float] = {}       # pond_id -> time.monotonic()
+last_poll_at: Dict[tuple, float] = {}           # (device_id หรือ device_type ของ endpoint เดิม, pond_id) -> time.monotonic()
+poll_rate_state = {"window_start": time.monotonic(), "count": 0, "rate": 0.0}
+
+def mark_pond_activity(pond_id: int):
+    pond_last_activity[pond_id] = time.monotonic()
+
+def record_poll(poller: str, pond_id: int) -> Optional[float]:
+    """นับการถามงาน คืนจำนวนวินาทีที่ต้องรอถ้าถามถี่เกินไป (None = ผ่าน)"""
+    now = time.monotonic()
+    key = (poller, pond_id)
+    previous = last_poll_at.get(key)
+    if previous is not None and now - previous < POLL_MIN_INTERVAL:
+        return POLL_MIN_INTERVAL - (now - previous)
+    last_poll_at[key] = now
+
+    poll_rate_state["count"] += 1
+    elapsed = now - poll_rate_state["window_start"]
+    if elapsed >= POLL_RATE_WINDOW:
+        poll_rate_state["rate"] = poll_rate_state["count"] / elapsed
+        poll_rate_state["window_start"] = now
+        poll_rate_state["count"] = 0
+    return None
+
+def throttle_if_needed(poller: str, pond_id: int):
+    """poller = device_id (ถ้ารู้) เพื่อให้หลายอุปกรณ์ในบ่อเดียวกันไม่ถูกจำกัดรวมกัน"""
+    retry_after = record_poll(poller, pond_id)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="ถามงานถี่เกินไป",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+def next_poll_hint(pond_id: int) -> float:
+    """จำนวนวินาทีที่แนะนำให้ Pi รอก่อนถามงานครั้งถัดไป"""
+    now = time.monotonic()
+    last_activity = pond_last_activity.get(pond_id)
+    if last_activity is None:
+        # ถามครั้งแรก: ถือว่าเงียบมาแล้ว ACTIVE_WINDOW ให้ backoff ทำงานต่อจากนี้
+        pond_last_activity[pond_id] = now - ACTIVE_WINDOW
+        hint = POLL_DEFAULT
+    else:
+        idle = now - last_activity
+        if idle <= ACTIVE_WINDOW:
+            hint = POLL_FAST
+        else:
+            hint = min(POLL_IDLE_MAX, POLL_DEFAULT * 2 ** int(idle // ACTIVE_WINDOW))
+
+    load = poll_rate_state["rate"] / POLL_RATE_CAPACITY
+    if load > 1:
+        hint *= load
+    return round(hint, 1)
+
+# === CONDITIONAL RESPONSES (ETag / 304) ===
+# Pi ส่ง If-None-Match เป็น ETag ที่ได้ครั้งก่อน ถ้างานของบ่อยังเหมือนเดิมจะได้ 304 ที่ไม่มี body
+# next_poll_seconds ส่งซ้ำใน header X-Next-Poll-Seconds เพราะ 304 ไม่มี body
+# ETag ขึ้นต้นด้วย BOOT_ID: เวอร์ชันเริ่มนับใหม่หลัง restart จึงต้องไม่ชนกับ ETag เก่าที่ Pi ถืออยู่
+BOOT_ID = uuid.uuid4().hex[:8]
+status_cache: Dict[str, Any] = {"version": None, "body": None}
+
+def job_etag(pond_id: int, capabilities: List[str]) -> str:
+    """ETag ของงานของบ่อนี้ ถ้ามีงานรอจะรวม admission version ด้วย (งานอาจถูกปล่อยเมื่อมีที่ว่าง)"""
+    tag = f"{pond_id}.{pond_versions.get(pond_id, 0)}"
+    if any(job_queues.get((pond_id, cap)) for cap in capabilities):
+        tag += f".{versions['admission']}"
+    return f'W/"{BOOT_ID}.{tag}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+# === MEDIA STORAGE ===
+# ไฟล์ถูกเก็บแบบ content-addressed: MEDIA_ROOT/objects/<sha[:2]>/<sha>
+# อัปโหลดไฟล์เดิมซ้ำจะไม่เขียนซ้ำ แค่เชื่อมกับงานเพิ่ม
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(tempfile.gettempdir(), "shrimp_media"))
+MEDIA_MAX_BYTES = 200 * 1024 * 1024
+MEDIA_READ_CHUNK = 64 * 1024
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# sha256 -> metadata ของไฟล์
+media_index: Dict[str, Dict[str, Any]] = {}
+
+def media_path(sha256: str) -> str:
+    return os.path.join(MEDIA_ROOT, "objects", sha256[:2], sha256)
+
+def link_media_to_job(pond_id: int, media: Dict[str, Any], job_id: Optional[int] = None) -> Optional[str]:
+    """ผูกไฟล์กับงานตาม job_id ที่ Pi ส่งมา (ไม่ระบุ = งานที่เสร็จล่าสุดของบ่อนี้)"""
+    job, state = None, None
+    if job_id is not None:
+        job = pending_jobs_by_id.get(job_id)
+        if job is not None:
+            state = "pending"
+        elif completed_jobs.get(pond_id, {}).get("id") == job_id:
+            job, state = completed_jobs[pond_id], "completed"
+    elif pond_id in completed_jobs:
+        job, state = completed_jobs[pond_id], "completed"
+    if job is None or job["pond_id"] != pond_id:
+        return None
+
+    linked = job.setdefault("media", [])
+    if all(item["sha256"] != media["sha256"] for item in linked):
+        linked.append(media)
+        touch_pond(pond_id)
+    return state
+
+def parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """แปลง header Range (ช่วงเดียว) เป็น (start, end) แบบรวมปลาย, None = ช่วงไม่ถูกต้อง"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        length = int(match.group(2))
+        start, end = max(0, size - length), size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(MEDIA_READ_CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+# === RECURRING SCHEDULES ===
+# ตั้งรอบเก็บตัวอย่างอัตโนมัติแบบ cron (นาที ชั่วโมง วันที่ เดือน วันในสัปดาห์) ต่อบ่อหรือกลุ่มบ่อ
+# - เมื่อถึงเวลา บ่อในรอบเดียวกันถูกปล่อยงานห่างกัน spacing_seconds + สุ่มเพิ่ม 0..jitter_seconds
+# - ทั้ง fleet ปล่อยงานได้ไม่เกิน 1 งานต่อ SCHEDULE_RELEASE_GAP วินาที (ไม่ให้ Pi ทุกตัวยกยอพร้อมกันตอนต้นชั่วโมง)
+#   schedule ที่ปล่อยงานครบทุกบ่อไม่ทันก่อนรอบถัดไปจะถูกปฏิเสธตอนสร้าง/แก้ไข (และเตือนตอนถึงรอบ)
+# - ทุก schedule ใช้ timer wheel ตัวเดียว เดินด้วย task เดียว (ไม่สร้าง task ต่อ schedule)
+# - นิยาม schedule และกลุ่มบ่อถูกบันทึกลง SCHEDULE_PATH แล้วโหลดกลับตอนเริ่ม server
+#   (รอบที่ตรงกับช่วงที่ server ดับอยู่จะถูกข้าม ไม่ยิงย้อนหลัง)
+SCHEDULE_PATH = os.environ.get("SCHEDULE_PATH", os.path.join(tempfile.gettempdir(), "shrimp_schedules.json"))
+SCHEDULE_TZ = timezone(timedelta(hours=float(os.environ.get("SCHEDULE_UTC_OFFSET", 7))))  # cron ตามเวลาไทย
+SCHEDULE_RELEASE_GAP = float(os.environ.get("SCHEDULE_RELEASE_GAP", 2.0))  # วินาที ระหว่างงานที่ scheduler ปล่อย (ทั้ง fleet)
+WHEEL_TICK = 1.0             # วินาทีต่อช่องของ timer wheel
+WHEEL_SLOTS = 3600           # wheel หมุนครบรอบทุก 1 ชั่วโมง งานที่ไกลกว่านั้นนับจำนวนรอบไว้
+
+# (ชื่อ, ค่าต่ำสุด, ค่าสูงสุด) ของแต่ละช่อง วันในสัปดาห์ 0 และ 7 = อาทิตย์
+CRON_FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7)]
+SCHEDULE_FIELDS = ["id", "name", "cron", "action", "pond_ids", "groups",
+                   "spacing_seconds", "jitter_seconds", "enabled", "created_at"]
+
+def parse_cron_field(text: str, name: str, low: int, high: int) -> Set[int]:
+    """รองรับ *, 5, 1-5, */15, 0-30/10 และคั่นด้วย , ได้"""
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"step ของช่อง {name} ต้องมากกว่า 0")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"ช่อง {name} ต้องอยู่ในช่วง {low}-{high}: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSpec:
+    """cron 5 ช่องมาตรฐาน (ถ้ากำหนดทั้งวันที่และวันในสัปดาห์ ตรงช่องใดช่องหนึ่งก็นับ)"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("cron ต้องมี 5 ช่อง: นาที ชั่วโมง วันที่ เดือน วันในสัปดาห์")
+        try:
+            parsed = [parse_cron_field(text, name, low, high) for text, (name, low, high) in zip(fields, CRON_FIELDS)]
+        except ValueError as e:
+            raise ValueError(f"cron ไม่ถูกต้อง ({expression}): {e}")
+        self.expression = expression
+        self.minutes, self.hours = sorted(parsed[0]), sorted(parsed[1])
+        self.days, self.months = parsed[2], parsed[3]
+        self.weekdays = {day % 7 for day in parsed[4]}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        self.next_after(datetime.now(SCHEDULE_TZ))  # cron ที่ไม่มีวันตรงเลย (เช่น 30 ก.พ.) -> ValueError
+
+    def _day_matches(self, day) -> bool:
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """เวลาแรกที่ตรงกับ cron หลังจาก after (ละเอียดระดับนาที)"""
+        start = after.astimezone(SCHEDULE_TZ).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(5 * 366):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    if day == start.date() and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=SCHEDULE_TZ)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"cron {self.expression} ไม่มีวันที่ตรงเลย")
+
+class TimerWheel:
+    """hashed timer wheel: เพิ่มรายการ O(1) และแต่ละ tick ดูแค่ช่องเดียว ไม่ว่าจะมีกี่ schedule/บ่อ"""
+
+    def __init__(self, tick: float, slots: int, now: float):
+        self.tick = tick
+        self.slots: List[list] = [[] for _ in range(slots)]
+        self.cursor = 0
+        self.current = now   # เวลาของช่องที่ cursor ชี้อยู่
+        self.size = 0
+
+    def add(self, due: float, item: Any):
+        ticks = max(1, math.ceil((due - self.current) / self.tick))
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot].append([(ticks - 1) // len(self.slots), due, item])
+        self.size += 1
+
+    def advance(self, now: float) -> List[Any]:
+        """เดิน cursor จนถึง now คืนรายการที่ถึงเวลาแล้ว (เรียงตามเวลา)"""
+        ready = []
+        while self.current + self.tick <= now:
+            self.current += self.tick
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            waiting = []
+            for entry in self.slots[self.cursor]:
+                if entry[0] == 0:
+                    ready.append((entry[1], entry[2]))
+                else:
+                    entry[0] -= 1
+                    waiting.append(entry)
+            self.size -= len(self.slots[self.cursor]) - len(waiting)
+            self.slots[self.cursor] = waiting
+        ready.sort(key=lambda entry: entry[0])
+        return [item for _, item in ready]
+
+schedules: Dict[str, Dict[str, Any]] = {}          # schedule_id -> นิยาม + สถิติ
+schedule_specs: Dict[str, CronSpec] = {}            # schedule_id -> cron ที่ parse แล้ว
+pond_groups: Dict[str, List[int]] = {}              # ชื่อกลุ่ม -> pond_ids
+release_cursor = {"next_free": 0.0}                # เวลา (epoch) ที่เร็วที่สุดที่ปล่อยงานถัดไปได้
+schedule_wheel = TimerWheel(WHEEL_TICK, WHEEL_SLOTS, time.time())
+scheduler_tasks: List[Any] = []
+
+def save_schedules():
+    """เขียนนิยาม schedule + กลุ่มบ่อลงไฟล์แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+    data = {
+        "schedules": [{field: schedule[field] for field in SCHEDULE_FIELDS} for schedule in schedules.values()],
+        "groups": pond_groups
+    }
+    directory = os.path.dirname(SCHEDULE_PATH) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".schedules-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, SCHEDULE_PATH)
+
+def schedule_targets(schedule: Dict[str, Any]) -> List[int]:
+    ponds = set(schedule["pond_ids"])
+    for group in schedule["groups"]:
+        ponds.update(pond_groups.get(group, []))
+    return sorted(ponds)
+
+def arm_schedule(schedule: Dict[str, Any], after: Optional[datetime] = None):
+    """ใส่รอบถัดไปของ schedule ลง timer wheel"""
+    if not schedule["enabled"]:
+        schedule["next_run_at"] = None
+        return
+    next_run = schedule_specs[schedule["id"]].next_after(after or datetime.now(SCHEDULE_TZ))
+    schedule["next_run_at"] = next_run.isoformat()
+    schedule_wheel.add(next_run.timestamp(), ("fire", schedule["id"], schedule["revision"]))
+
+def install_schedule(definition: Dict[str, Any], revision: int = 1) -> Dict[str, Any]:
+    schedule_specs[definition["id"]] = CronSpec(definition["cron"])
+    schedule = {
+        **definition,
+        "revision": revision,
+        "next_run_at": None,
+        "last_run_at": None,
+        "released": 0,
+        "skipped_busy": 0
+    }
+    schedules[definition["id"]] = schedule
+    arm_schedule(schedule)
+    return schedule
+
+def load_schedules():
+    if not os.path.exists(SCHEDULE_PATH):
+        return
+    try:
+        with open(SCHEDULE_PATH) as f:
+            data = json.load(f)
+        pond_groups.update({name: list(ponds) for name, ponds in data.get("groups", {}).items()})
+        for definition in data.get("schedules", []):
+            install_schedule(definition)
+        print(f"🗓️ โหลด {len(schedules)} schedule และ {len(pond_groups)} กลุ่มบ่อจาก {SCHEDULE_PATH}")
+    except Exception as e:
+        print(f"❌ Error ในการโหลด schedule: {e}")
+
+def reserve_release_slot(desired: float) -> float:
+    """เวลาปล่อยงานไม่ก่อน desired และห่างจากงานที่จองไว้ก่อนหน้าอย่างน้อย SCHEDULE_RELEASE_GAP (O(1))"""
+    release_at = max(desired, release_cursor["next_free"])
+    release_cursor["next_free"] = release_at + SCHEDULE_RELEASE_GAP
+    return release_at
+
+def schedule_round_seconds(schedule: Dict[str, Any], pond_count: int) -> float:
+    """เวลาตั้งแต่ถึงรอบจนปล่อยงานบ่อสุดท้าย (ไม่นับ schedule อื่นที่ใช้ช่องเวลาร่วมกัน)"""
+    if pond_count == 0:
+        return 0.0
+    spread = (pond_count - 1) * schedule["spacing_seconds"] + schedule["jitter_seconds"]
+    return max(spread, (pond_count - 1) * SCHEDULE_RELEASE_GAP)
+
+def cron_min_interval(spec: CronSpec, samples: int = 24) -> float:
+    """ระยะห่างที่สั้นที่สุดระหว่างรอบ (วินาที) จาก samples รอบถัดไป"""
+    run = spec.next_after(datetime.now(SCHEDULE_TZ))
+    shortest = math.inf
+    for _ in range(samples):
+        following = spec.next_after(run)
+        shortest = min(shortest, (following - run).total_seconds())
+        run = following
+    return shortest
+
+def fire_schedule(schedule: Dict[str, Any], fired_at: float):
+    """ถึงรอบ: กระจายเวลาปล่อยงานของแต่ละบ่อ แล้วตั้งรอบถัดไป"""
+    schedule["last_run_at"] = datetime.fromtimestamp(fired_at, SCHEDULE_TZ).isoformat()
+    targets = schedule_targets(schedule)
+    for index, pond_id in enumerate(targets):
+        desired = fired_at + index * schedule["spacing_seconds"] + random.uniform(0, schedule["jitter_seconds"])
+        release_at = reserve_release_slot(desired)
+        schedule_wheel.add(release_at, ("release", schedule["id"], schedule["revision"], pond_id, release_at))
+    print(f"🗓️ schedule {schedule['name'] or schedule['id']} ถึงรอบ: {len(targets)} บ่อ")
+    if targets:
+        next_run = schedule_specs[schedule["id"]].next_after(datetime.fromtimestamp(fired_at, SCHEDULE_TZ))
+        if release_at >= next_run.timestamp():
+            print(f"⚠️ schedule {schedule['name'] or schedule['id']}: ปล่อยงานบ่อสุดท้ายได้ตอน "
+                  f"{datetime.fromtimestamp(release_at, SCHEDULE_TZ).isoformat()} หลังรอบถัดไป "
+                  f"({next_run.isoformat()}) ลดจำนวนบ่อ/spacing หรือเพิ่มระยะห่างของ cron")
+
+def release_scheduled_job(schedule: Dict[str, Any], pond_id: int):
+    """ปล่อยงานเข้าคิว (ข้ามถ้าบ่อนี้ยังมีงานชนิดเดียวกันค้างอยู่ ไม่ให้งานสะสม)"""
+    capability = ACTION_CAPABILITY[schedule["action"]]
+    if job_queues.get((pond_id, capability)):
+        schedule["skipped_busy"] += 1
+        print(f"⏭️ ข้ามบ่อ {pond_id} (schedule {schedule['id']}): ยังมีงานค้างอยู่")
+        return
+    job = enqueue_job(pond_id, schedule["action"], datetime.now().isoformat())
+    job["schedule_id"] = schedule["id"]
+    schedule["released"] += 1
+    print(f"📝 schedule {schedule['id']} ปล่อยงาน {schedule['action']} ให้บ่อ {pond_id}")
+
+def handle_wheel_item(item: tuple):
+    kind, schedule_id, revision = item[:3]
+    schedule = schedules.get(schedule_id)
+    if schedule is None or schedule["revision"] != revision or not schedule["enabled"]:
+        return  # schedule ถูกลบ/แก้ไขแล้ว รายการเก่าใน wheel ไม่มีผล
+    if kind == "fire":
+        fire_schedule(schedule, time.time())
+        arm_schedule(schedule)
+    else:
+        release_scheduled_job(schedule, item[3])
+
+async def run_schedule_wheel():
+    """task เดียวของ scheduler: เดิน timer wheel ทุก WHEEL_TICK วินาที"""
+    while True:
+        await asyncio.sleep(WHEEL_TICK)
+        for item in schedule_wheel.advance(time.time()):
+            try:
+                handle_wheel_item(item)
+            except Exception as e:
+                print(f"❌ Error ใน scheduler ({item[0]} {item[1]}): {e}")
 
 # === API ENDPOINTS ===
 
@@ -50,54 +858,39 @@ async def root():
         "endpoints": {
             "POST /api/lift-up": "ส่งคำสั่งยกยอขึ้น (Frontend)",
             "POST /api/cam-side": "ส่งคำสั่ง cam_side (Frontend)",
+            "POST /api/commands": "ส่งคำสั่งใดก็ได้ {pondId, action} ระบบเลือกอุปกรณ์ตาม capability",
+            "POST /devices/register": "อุปกรณ์ประกาศบ่อและ capability ของตัวเอง",
+            "GET /devices": "รายชื่ออุปกรณ์ที่ลงทะเบียน",
+            "GET /devices/{device_id}/job": "อุปกรณ์ถามว่ามีงานที่ตัวเองทำได้มั้ย",
+            "POST /devices/{device_id}/job/complete": "อุปกรณ์แจ้งงานเสร็จ",
             "GET /job/{pond_id}": "Pi ถามว่ามีงานมั้ย (RSPI1)",
             "GET /job-rspi2/{pond_id}": "Pi ถามว่ามีงานมั้ย (RSPI2)",
             "POST /job/{pond_id}/complete": "Pi แจ้งงานเสร็จ (RSPI1)",
             "POST /job-rspi2/{pond_id}/complete": "Pi แจ้งงานเสร็จ (RSPI2)",
+            "POST /heartbeat": "Pi แจ้งว่ายังออนไลน์ + รับงานที่ค้างในคำขอเดียว",
+            "GET /fleet": "ดูสถานะ online/stale/offline ของอุปกรณ์ทั้งหมด",
+            "POST /media/{pond_id}?filename=...&job_id=...": "อัปโหลดภาพ/วิดีโอ (raw body) เก็บแบบ content-addressed",
+            "GET /media/{sha256}": "ดาวน์โหลดไฟล์ (รองรับ Range)",
+            "GET /schedules": "รายการรอบเก็บตัวอย่างอัตโนมัติ (cron) พร้อมเวลารอบถัดไป",
+            "POST /schedules": "สร้างรอบอัตโนมัติ {cron, action, pond_ids/groups, spacing_seconds, jitter_seconds}",
+            "PUT /pond-groups/{name}": "ตั้งกลุ่มบ่อสำหรับใช้ใน schedule",
+            "GET /admission": "งานที่กำลังทำพร้อมกัน ขีดจำกัด และเวลารอคิว",
+            "PUT /admission": "ปรับขีดจำกัดงานพร้อมกัน (ทั้งระบบ / ต่อ device_type)",
+            "GET /timings": "percentile เวลาแต่ละช่วงของงาน ทั้ง fleet และรายบ่อ",
+            "GET /timings/{pond_id}": "percentile เวลาแต่ละช่วงของงานของบ่อนี้",
             "GET /status": "ดูสถานะระบบ"
         }
     }
 
-@app.post("/api/cam-side")
-async def create_cam_side_command(command: CamSideCommand):
-    """Frontend ส่งคำสั่ง cam_side มา"""
-    try:
-        # แปลง pondId เป็น int
-        pond_id = int(command.pondId)
-        
-        # เพิ่ม timestamp ถ้าไม่มี
-        if not command.timestamp:
-            command.timestamp = datetime.now().isoformat()
-        
-        # เก็บงานไว้ใน pending_job_RSPI2
-        job_data = {
-            "pond_id": pond_id,
-            "action": command.action,
-            "timestamp": command.timestamp,
-            "created_at": datetime.now().isoformat(),
-            "status": "pending"
-        }
-        
-        pending_job_RSPI2[pond_id] = job_data
-        
-        print(f"📝 รับคำสั่ง cam_side สำหรับบ่อ {pond_id} เรียบร้อย")
-        
-        return {
-            "success": True,
-            "message": f"คำสั่ง cam_side สำหรับบ่อ {pond_id} ถูกบันทึกแล้ว",
-            "job_id": pond_id,
-            "timestamp": command.timestamp
-        }
-        
-    except ValueError:
-        raise HTTPException(status_code=400, detail="pondId ต้องเป็นตัวเลข")
-    except Exception as e:
-        print(f"❌ Error ในการรับคำสั่ง cam_side: {e}")
-        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
+def create_command(command: Command, idempotency_key: Optional[str]) -> Dict[str, Any]:
+    """สร้างงานจากคำสั่ง frontend แล้วเข้าคิวตาม capability ที่ action ต้องใช้"""
+    scope = "command"
+    payload = command.model_dump()
+    replay = idempotency_cache.lookup(scope, idempotency_key, payload)
+    if replay is not None:
+        print(f"🔁 ได้รับคำสั่ง {command.action} ซ้ำ (Idempotency-Key: {idempotency_key}) ส่งผลเดิมกลับไป")
+        return replay
 
-@app.post("/api/lift-up")
-async def create_lift_up_command(command: LiftUpCommand):
-    """Frontend ส่งคำสั่งยกยอขึ้นมา"""
     try:
         # แปลง pondId เป็น int
         pond_id = int(command.pondId)
@@ -106,146 +899,602 @@ async def create_lift_up_command(command: LiftUpCommand):
         if not command.timestamp:
             command.timestamp = datetime.now().isoformat()
         
-        # เก็บงานไว้ใน pending_jobs
-        job_data = {
-            "pond_id": pond_id,
-            "action": command.action,
-            "timestamp": command.timestamp,
-            "created_at": datetime.now().isoformat(),
-            "status": "pending"
-        }
-        
-        pending_jobs[pond_id] = job_data
+        # กดซ้ำ (เช่น double-click) ขณะงานเดิมยังค้าง: คืนงานเดิม ไม่ให้ Pi ยก/ถ่ายสองรอบ
+        job = find_pending_job(pond_id, command.action)
+        duplicate = job is not None
+        if not duplicate:
+            job = enqueue_job(pond_id, command.action, command.timestamp)
+        capable = sorted(capability_index.get((pond_id, job["capability"]), set()))
+        label = ACTION_LABELS.get(command.action, command.action)
         
-        print(f"📝 รับคำสั่งยกยอขึ้นสำหรับบ่อ {pond_id} เรียบร้อย")
+        if duplicate:
+            print(f"🔁 บ่อ {pond_id} มีคำสั่ง{label}ค้างอยู่แล้ว (job {job['id']}) ไม่เพิ่มงานซ้ำ")
+        else:
+            print(f"📝 รับคำสั่ง{label}สำหรับบ่อ {pond_id} เรียบร้อย (อุปกรณ์ที่ทำได้: {capable or 'ยังไม่มี'})")
         
-        return {
+        response = {
             "success": True,
-            "message": f"คำสั่งยกยอขึ้นสำหรับบ่อ {pond_id} ถูกบันทึกแล้ว",
+            "message": f"คำสั่ง{label}สำหรับบ่อ {pond_id} ถูกบันทึกแล้ว",
             "job_id": pond_id,
-            "timestamp": command.timestamp
+            "job_uid": job["id"],
+            "capability": job["capability"],
+            "routed_to": capable,
+            "duplicate": duplicate,
+            "timestamp": job["timestamp"]
         }
+        idempotency_cache.store(scope, idempotency_key, payload, response)
+        return response
         
     except ValueError:
         raise HTTPException(status_code=400, detail="pondId ต้องเป็นตัวเลข")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error ในการรับคำสั่งยกยอขึ้น: {e}")
+        print(f"❌ Error ในการรับคำสั่ง {command.action}: {e}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
 
-
-@app.get("/job/{pond_id}")
-async def get_job(pond_id: int):
-    """Pi ถามว่ามีงานสำหรับบ่อนี้มั้ย (RSPI1)"""
+def poll_job(pond_id: int, capabilities: List[str], label: str, device_type: str, holder: str,
+             response: Response, if_none_match: Optional[str]):
+    """อุปกรณ์ถามว่ามีงานที่ตัวเองทำได้ในบ่อนี้มั้ย (304 ถ้าไม่มีอะไรเปลี่ยนจาก ETag ที่ส่งมา)"""
     try:
-        if pond_id in pending_jobs:
-            job = pending_jobs[pond_id]
-            print(f"📤 ส่งงานให้บ่อ {pond_id} (RSPI1): {job}")
+        job, waiting_reason = dispatch_job(pond_id, capabilities, device_type, holder)
+        next_poll = next_poll_hint(pond_id)
+        headers = {"ETag": job_etag(pond_id, capabilities), "X-Next-Poll-Seconds": str(next_poll)}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+        if job is not None:
+            print(f"📤 ส่งงานให้บ่อ {pond_id} ({label}): {job}")
             
             return JobResponse(
                 has_job=True,
                 job_data=job,
-                message=f"มีงานสำหรับบ่อ {pond_id} (RSPI1)"
+                message=f"มีงานสำหรับบ่อ {pond_id} ({label})",
+                next_poll_seconds=next_poll
             )
-        else:
+        elif waiting_reason is not None:
             return JobResponse(
                 has_job=False,
                 job_data=None,
-                message=f"ไม่มีงานสำหรับบ่อ {pond_id} (RSPI1)"
-            )
-            
-    except Exception as e:
-        print(f"❌ Error ในการตรวจสอบงาน RSPI1: {e}")
-        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
-
-@app.get("/job-rspi2/{pond_id}")
-async def get_job_rspi2(pond_id: int):
-    """Pi ถามว่ามีงานสำหรับบ่อนี้มั้ย (RSPI2)"""
-    try:
-        if pond_id in pending_job_RSPI2:
-            job = pending_job_RSPI2[pond_id]
-            print(f"📤 ส่งงานให้บ่อ {pond_id} (RSPI2): {job}")
-            
-            return JobResponse(
-                has_job=True,
-                job_data=job,
-                message=f"มีงานสำหรับบ่อ {pond_id} (RSPI2)"
+                message=f"มีงานรอคิวสำหรับบ่อ {pond_id} ({label})",
+                next_poll_seconds=next_poll,
+                waiting_reason=waiting_reason
             )
         else:
             return JobResponse(
                 has_job=False,
                 job_data=None,
-                message=f"ไม่มีงานสำหรับบ่อ {pond_id} (RSPI2)"
+                message=f"ไม่มีงานสำหรับบ่อ {pond_id} ({label})",
+                next_poll_seconds=next_poll
             )
             
     except Exception as e:
-        print(f"❌ Error ในการตรวจสอบงาน RSPI2: {e}")
+        print(f"❌ Error ในการตรวจสอบงาน {label}: {e}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
 
-@app.post("/job/{pond_id}/complete")
-async def complete_job(pond_id: int, result: Dict[str, Any]):
-    """Pi แจ้งว่าเสร็จงานแล้ว (RSPI1)"""
+def complete_for(pond_id: int, capabilities: List[str], result: Dict[str, Any],
+                 idempotency_key: Optional[str], scope: str, label: str) -> Dict[str, Any]:
+    """อุปกรณ์แจ้งว่าเสร็จงานแล้ว"""
+    replay = idempotency_cache.lookup(scope, idempotency_key, result)
+    if replay is not None:
+        print(f"🔁 ได้รับการแจ้งงานเสร็จซ้ำของบ่อ {pond_id} ({label}) ส่งผลเดิมกลับไป")
+        return replay
+
     try:
-        if pond_id in pending_jobs:
-            # ย้ายจาก pending ไป completed
-            job = pending_jobs.pop(pond_id)
-            job["status"] = "completed"
-            job["completed_at"] = datetime.now().isoformat()
-            job["result"] = result
-            
-            completed_jobs[pond_id] = job
-            
-            print(f"✅ บ่อ {pond_id} เสร็จงานแล้ว (RSPI1): {result}")
+        job = finish_job(pond_id, capabilities, result)
+        if job is not None:
+            print(f"✅ บ่อ {pond_id} เสร็จงานแล้ว ({label}): {result}")
             
-            return {
+            response = {
                 "success": True,
-                "message": f"บันทึกการเสร็จงานของบ่อ {pond_id} เรียบร้อย (RSPI1)"
+                "message": f"บันทึกการเสร็จงานของบ่อ {pond_id} เรียบร้อย ({label})"
             }
+            idempotency_cache.store(scope, idempotency_key, result, response)
+            return response
         else:
-            raise HTTPException(status_code=404, detail=f"ไม่พบงานสำหรับบ่อ {pond_id} (RSPI1)")
+            raise HTTPException(status_code=404, detail=f"ไม่พบงานสำหรับบ่อ {pond_id} ({label})")
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error ในการบันทึกงานเสร็จ RSPI1: {e}")
+        print(f"❌ Error ในการบันทึกงานเสร็จ {label}: {e}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
 
+def get_registered_device(device_id: str) -> Dict[str, Any]:
+    device = devices.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบอุปกรณ์ {device_id} กรุณาลงทะเบียนก่อน")
+    return device
+
+@app.post("/api/commands")
+async def create_generic_command(command: Command, idempotency_key: Optional[str] = Header(None)):
+    """Frontend ส่งคำสั่งใดก็ได้ ระบบส่งเข้าคิวของอุปกรณ์ที่มี capability ตรงกับ action"""
+    return create_command(command, idempotency_key)
+
+@app.post("/api/cam-side")
+async def create_cam_side_command(command: CamSideCommand, idempotency_key: Optional[str] = Header(None)):
+    """Frontend ส่งคำสั่ง cam_side มา"""
+    return create_command(Command(**command.model_dump()), idempotency_key)
+
+@app.post("/api/lift-up")
+async def create_lift_up_command(command: LiftUpCommand, idempotency_key: Optional[str] = Header(None)):
+    """Frontend ส่งคำสั่งยกยอขึ้นมา"""
+    return create_command(Command(**command.model_dump()), idempotency_key)
+
+@app.post("/devices/register")
+async def register(registration: DeviceRegistration):
+    """อุปกรณ์ประกาศว่าอยู่บ่อไหนและทำอะไรได้บ้าง"""
+    device = register_device(registration.device_id, registration.pond_id,
+                             registration.device_type, registration.capabilities)
+    print(f"🆕 ลงทะเบียนอุปกรณ์ {device['device_id']} บ่อ {device['pond_id']}: {device['capabilities']}")
+    return {"success": True, "device": device}
+
+@app.get("/devices")
+async def list_devices():
+    """รายชื่ออุปกรณ์ที่ลงทะเบียนทั้งหมด"""
+    return {"count": len(devices), "devices": list(devices.values())}
+
+@app.get("/devices/{device_id}/job")
+async def get_device_job(device_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """อุปกรณ์ที่ลงทะเบียนแล้วถามว่ามีงานที่ตัวเองทำได้มั้ย"""
+    device = get_registered_device(device_id)
+    throttle_if_needed(device_id, device["pond_id"])
+    return poll_job(device["pond_id"], device["capabilities"], device_id, device["device_type"], device_id,
+                    response, if_none_match)
+
+@app.post("/devices/{device_id}/job/complete")
+async def complete_device_job(device_id: str, result: Dict[str, Any], idempotency_key: Optional[str] = Header(None)):
+    """อุปกรณ์ที่ลงทะเบียนแล้วแจ้งงานเสร็จ"""
+    device = get_registered_device(device_id)
+    return complete_for(device["pond_id"], device["capabilities"], result,
+                        idempotency_key, f"complete:{device_id}", device_id)
+
+# --- endpoint เดิมของ RSPI1 / RSPI2 (ใช้ capability ตาม device_type) ---
+
+@app.get("/job/{pond_id}")
+async def get_job(pond_id: int, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Pi ถามว่ามีงานสำหรับบ่อนี้มั้ย (RSPI1)"""
+    throttle_if_needed("RSPI1", pond_id)
+    return poll_job(pond_id, DEVICE_TYPE_CAPABILITIES["RSPI1"], "RSPI1", "RSPI1", f"RSPI1:{pond_id}",
+                    response, if_none_match)
+
+@app.get("/job-rspi2/{pond_id}")
+async def get_job_rspi2(pond_id: int, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Pi ถามว่ามีงานสำหรับบ่อนี้มั้ย (RSPI2)"""
+    throttle_if_needed("RSPI2", pond_id)
+    return poll_job(pond_id, DEVICE_TYPE_CAPABILITIES["RSPI2"], "RSPI2", "RSPI2", f"RSPI2:{pond_id}",
+                    response, if_none_match)
+
+@app.post("/job/{pond_id}/complete")
+async def complete_job(pond_id: int, result: Dict[str, Any], idempotency_key: Optional[str] = Header(None)):
+    """Pi แจ้งว่าเสร็จงานแล้ว (RSPI1)"""
+    return complete_for(pond_id, DEVICE_TYPE_CAPABILITIES["RSPI1"], result,
+                        idempotency_key, f"complete:RSPI1:{pond_id}", "RSPI1")
+
 @app.post("/job-rspi2/{pond_id}/complete")
-async def complete_job_rspi2(pond_id: int, result: Dict[str, Any]):
+async def complete_job_rspi2(pond_id: int, result: Dict[str, Any], idempotency_key: Optional[str] = Header(None)):
     """Pi แจ้งว่าเสร็จงานแล้ว (RSPI2)"""
+    return complete_for(pond_id, DEVICE_TYPE_CAPABILITIES["RSPI2"], result,
+                        idempotency_key, f"complete:RSPI2:{pond_id}", "RSPI2")
+
+@app.post("/heartbeat")
+async def heartbeat(beat: Heartbeat, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Pi ส่ง heartbeat และได้งานที่ค้างกลับไปใน response เดียวกัน
+
+    บันทึกว่าออนไลน์ทุกครั้ง แต่ถ้าส่ง If-None-Match มาและงานของบ่อไม่เปลี่ยน จะตอบ 304 ไม่มี body
+    """
+    throttle_if_needed(beat.device_id, beat.pond_id)
     try:
-        if pond_id in pending_job_RSPI2:
-            # ย้ายจาก pending_job_RSPI2 ไป completed
-            job = pending_job_RSPI2.pop(pond_id)
-            job["status"] = "completed"
-            job["completed_at"] = datetime.now().isoformat()
-            job["result"] = result
-            
-            completed_jobs[pond_id] = job
-            
-            print(f"✅ บ่อ {pond_id} เสร็จงานแล้ว (RSPI2): {result}")
-            
-            return {
-                "success": True,
-                "message": f"บันทึกการเสร็จงานของบ่อ {pond_id} เรียบร้อย (RSPI2)"
-            }
+        device = register_device(beat.device_id, beat.pond_id, beat.device_type, beat.capabilities)
+        next_poll = next_poll_hint(beat.pond_id)
+        device_last_seen[beat.device_id] = {
+            "device_id": beat.device_id,
+            "pond_id": beat.pond_id,
+            "device_type": beat.device_type,
+            "status": beat.status,
+            # Pi ส่ง readiness เฉพาะตอนสถานะเปลี่ยน
+            "readiness": beat.readiness or device_last_seen.get(beat.device_id, {}).get("readiness"),
+            "device_timestamp": beat.timestamp,
+            "received_at": datetime.now().isoformat(),
+            "last_seen": time.monotonic(),
+            "next_poll_seconds": next_poll
+        }
+
+        job, waiting_reason = dispatch_job(beat.pond_id, device["capabilities"], beat.device_type, beat.device_id)
+        headers = {"ETag": job_etag(beat.pond_id, device["capabilities"]), "X-Next-Poll-Seconds": str(next_poll)}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+        if job is not None:
+            print(f"📤 ส่งงานให้บ่อ {beat.pond_id} ผ่าน heartbeat ({beat.device_type}): {job}")
+
+        return {
+            "success": True,
+            "has_job": job is not None,
+            "job_data": job,
+            "waiting_reason": waiting_reason,
+            "next_poll_seconds": next_poll,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        print(f"❌ Error ในการรับ heartbeat: {e}")
+        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
+
+@app.get("/fleet")
+async def get_fleet():
+    """ดูสถานะอุปกรณ์ทั้งหมดจาก heartbeat ล่าสุด"""
+    expire_leases()
+    now = time.monotonic()
+    busy = {lease["holder"]: job_id for job_id, lease in inflight_leases.items()}
+    fleet = {"online": [], "stale": [], "offline": []}
+    for entry in device_last_seen.values():
+        job_id = busy.get(entry["device_id"])
+        fleet[device_state(entry, now, job_id is not None)].append({
+            "device_id": entry["device_id"],
+            "pond_id": entry["pond_id"],
+            "device_type": entry["device_type"],
+            "status": "busy" if job_id is not None else entry["status"],
+            "job_id": job_id,
+            "readiness": (entry.get("readiness") or {}).get("state"),
+            "startup": entry.get("readiness"),
+            "last_seen_at": entry["received_at"],
+            "seconds_since_seen": round(now - entry["last_seen"], 1)
+        })
+
+    return {
+        "online_count": len(fleet["online"]),
+        "stale_count": len(fleet["stale"]),
+        "offline_count": len(fleet["offline"]),
+        **fleet,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/media/{pond_id}")
+async def upload_media(pond_id: int, request: Request, filename: str = "upload.bin",
+                       sha256: Optional[str] = None, job_id: Optional[int] = None):
+    """รับไฟล์จาก Pi แบบ stream ลงดิสก์ทีละ chunk (ไม่เก็บทั้งไฟล์ในหน่วยความจำ)
+
+    ถ้าส่ง ?sha256= มากับ body ว่าง: มีไฟล์แล้ว -> ผูกกับงานเลย, ยังไม่มี -> 404 (ให้ส่งเนื้อไฟล์มา)
+    ?job_id= ระบุงานที่ไฟล์นี้เป็นของ (ไม่ระบุ = ผูกกับงานที่เสร็จล่าสุดของบ่อ)
+    """
+    content_type = request.headers.get("content-type") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    expected_sha256 = sha256.lower() if sha256 else None
+    tmp_dir = os.path.join(MEDIA_ROOT, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MEDIA_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"ไฟล์ใหญ่เกิน {MEDIA_MAX_BYTES} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            os.remove(tmp_path)
+            if expected_sha256 and SHA256_PATTERN.match(expected_sha256) and os.path.exists(media_path(expected_sha256)):
+                sha256 = expected_sha256
+                size = os.path.getsize(media_path(sha256))
+            elif expected_sha256:
+                raise HTTPException(status_code=404, detail="ยังไม่มีไฟล์นี้ กรุณาส่งเนื้อไฟล์")
+            else:
+                raise HTTPException(status_code=400, detail="ไม่มีข้อมูลไฟล์")
         else:
-            raise HTTPException(status_code=404, detail=f"ไม่พบงานสำหรับบ่อ {pond_id} (RSPI2)")
-            
+            sha256 = digest.hexdigest()
+            if expected_sha256 and expected_sha256 != sha256:
+                raise HTTPException(status_code=400, detail="sha256 ไม่ตรงกับเนื้อไฟล์")
+
+        final_path = media_path(sha256)
+        duplicate = os.path.exists(final_path)
+        if duplicate:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+
+        media = media_index.setdefault(sha256, {
+            "sha256": sha256,
+            "size": size,
+            "content_type": content_type,
+            "filename": filename,
+            "created_at": datetime.now().isoformat()
+        })
+        linked = {
+            "sha256": sha256,
+            "filename": filename,
+            "content_type": media["content_type"],
+            "size": size,
+            "url": f"/media/{sha256}"
+        }
+        job_state = link_media_to_job(pond_id, linked, job_id)
+
+        print(f"{'♻️ ไฟล์ซ้ำ' if duplicate else '💾 เก็บไฟล์'} {filename} ({size} bytes) ของบ่อ {pond_id} → {sha256[:12]}")
+
+        return {
+            "success": True,
+            "duplicate": duplicate,
+            "linked_job": job_state,
+            **linked
+        }
+
+    except HTTPException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     except Exception as e:
-        print(f"❌ Error ในการบันทึกงานเสร็จ RSPI2: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"❌ Error ในการรับไฟล์: {e}")
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
 
-@app.get("/status")
-async def get_status():
-    """ดูสถานะระบบ"""
+@app.api_route("/media/{sha256}", methods=["GET", "HEAD"])
+async def get_media(sha256: str, request: Request):
+    """ส่งไฟล์ตาม hash รองรับ Range: bytes=... สำหรับ dashboard (เล่นวิดีโอ/seek)"""
+    if not SHA256_PATTERN.match(sha256) or not os.path.exists(media_path(sha256)):
+        raise HTTPException(status_code=404, detail="ไม่พบไฟล์")
+
+    path = media_path(sha256)
+    size = os.path.getsize(path)
+    meta = media_index.get(sha256, {})
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{sha256}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    media_type = meta.get("content_type", "application/octet-stream")
+
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            raise HTTPException(status_code=416, detail="Range ไม่ถูกต้อง", headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    body = iter_file(path, start, length) if request.method == "GET" else iter(())
+    return StreamingResponse(body, status_code=status_code, media_type=media_type, headers=headers)
+
+def schedule_definition(schedule_id: str, request: ScheduleRequest, created_at: str) -> Dict[str, Any]:
+    if request.action not in ACTION_CAPABILITY:
+        raise HTTPException(status_code=400, detail=f"ไม่รู้จัก action: {request.action}")
+    if not request.pond_ids and not request.groups:
+        raise HTTPException(status_code=400, detail="ต้องระบุ pond_ids หรือ groups อย่างน้อยหนึ่งอย่าง")
+    if request.spacing_seconds < 0 or request.jitter_seconds < 0:
+        raise HTTPException(status_code=400, detail="spacing_seconds และ jitter_seconds ต้องไม่ติดลบ")
+    return {"id": schedule_id, "created_at": created_at, **request.model_dump()}
+
+def apply_schedule(definition: Dict[str, Any], revision: int) -> Dict[str, Any]:
+    try:
+        # ปล่อยงานครบทุกบ่อไม่ทันก่อนรอบถัดไป = รอบใหม่จะทับรอบเก่าเรื่อย ๆ
+        round_seconds = schedule_round_seconds(definition, len(schedule_targets(definition)))
+        interval = cron_min_interval(CronSpec(definition["cron"]))
+        if round_seconds >= interval:
+            raise HTTPException(status_code=400, detail=(
+                f"ปล่อยงานครบทุกบ่อต้องใช้ {round_seconds:.0f} วินาที แต่ cron ห่างกันแค่ {interval:.0f} วินาที "
+                f"(SCHEDULE_RELEASE_GAP={SCHEDULE_RELEASE_GAP})"))
+        schedule = install_schedule(definition, revision)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    save_schedules()
+    return schedule
+
+def public_schedule(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    return {**{k: v for k, v in schedule.items() if k != "revision"}, "target_ponds": schedule_targets(schedule)}
+
+@app.on_event("startup")
+async def start_scheduler():
+    load_schedules()
+    scheduler_tasks.append(asyncio.create_task(run_schedule_wheel()))
+
+@app.get("/schedules")
+async def list_schedules():
+    """รอบเก็บตัวอย่างอัตโนมัติทั้งหมด"""
     return {
-        "pending_jobs": len(pending_jobs),
-        "pending_job_RSPI2": len(pending_job_RSPI2),
-        "completed_jobs": len(completed_jobs),
-        "pending_job_list": list(pending_jobs.keys()),
-        "pending_job_RSPI2_list": list(pending_job_RSPI2.keys()),
-        "completed_job_list": list(completed_jobs.keys()),
+        "count": len(schedules),
+        "schedules": [public_schedule(schedule) for schedule in schedules.values()],
+        "wheel_entries": schedule_wheel.size,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.post("/schedules")
+async def create_schedule(request: ScheduleRequest):
+    """สร้างรอบอัตโนมัติ (cron ตามเวลา SCHEDULE_UTC_OFFSET)"""
+    try:
+        definition = schedule_definition(uuid.uuid4().hex[:12], request, datetime.now().isoformat())
+        schedule = apply_schedule(definition, 1)
+        print(f"🗓️ สร้าง schedule {schedule['id']} ({schedule['cron']}) รอบถัดไป {schedule['next_run_at']}")
+        return {"success": True, "schedule": public_schedule(schedule)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error ในการสร้าง schedule: {e}")
+        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
+
+@app.get("/schedules/{schedule_id}")
+async def get_schedule(schedule_id: str):
+    schedule = schedules.get(schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบ schedule {schedule_id}")
+    return public_schedule(schedule)
+
+@app.put("/schedules/{schedule_id}")
+async def update_schedule(schedule_id: str, request: ScheduleRequest):
+    """แก้ไข schedule (รายการเดิมที่ค้างใน timer wheel จะถูกข้ามเพราะ revision ไม่ตรง)"""
+    previous = schedules.get(schedule_id)
+    if previous is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบ schedule {schedule_id}")
+    try:
+        definition = schedule_definition(schedule_id, request, previous["created_at"])
+        schedule = apply_schedule(definition, previous["revision"] + 1)
+        return {"success": True, "schedule": public_schedule(schedule)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error ในการแก้ไข schedule: {e}")
+        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
+
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    if schedules.pop(schedule_id, None) is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบ schedule {schedule_id}")
+    schedule_specs.pop(schedule_id, None)
+    save_schedules()
+    return {"success": True, "message": f"ลบ schedule {schedule_id} แล้ว"}
+
+@app.post("/schedules/{schedule_id}/run")
+async def run_schedule_now(schedule_id: str):
+    """สั่งให้ถึงรอบทันที (ยังกระจายเวลาตาม spacing/jitter เหมือนรอบปกติ)"""
+    schedule = schedules.get(schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบ schedule {schedule_id}")
+    fire_schedule(schedule, time.time())
+    return {"success": True, "target_ponds": schedule_targets(schedule)}
+
+@app.get("/pond-groups")
+async def list_pond_groups():
+    return {"groups": pond_groups}
+
+@app.put("/pond-groups/{name}")
+async def put_pond_group(name: str, group: PondGroup):
+    """ตั้ง/แทนที่สมาชิกของกลุ่มบ่อ (schedule ที่ใช้กลุ่มนี้เห็นผลในรอบถัดไป)"""
+    pond_groups[name] = sorted(set(group.pond_ids))
+    save_schedules()
+    return {"success": True, "name": name, "pond_ids": pond_groups[name]}
+
+@app.delete("/pond-groups/{name}")
+async def delete_pond_group(name: str):
+    if pond_groups.pop(name, None) is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบกลุ่ม {name}")
+    save_schedules()
+    return {"success": True, "message": f"ลบกลุ่ม {name} แล้ว"}
+
+@app.get("/admission")
+async def get_admission():
+    """ขีดจำกัดงานพร้อมกัน งานที่กำลังทำ (lease) และเวลารอคิว"""
+    expire_leases()
+    now = time.monotonic()
+    waiting = sum(
+        1 for queue in job_queues.values() for job in queue if job["id"] not in inflight_leases
+    )
+    return {
+        "limits": admission_limits,
+        "lease_seconds": JOB_LEASE_SECONDS,
+        "inflight": len(inflight_leases),
+        "inflight_by_type": {device_type: count for device_type, count in inflight_by_type.items() if count},
+        "waiting": waiting,
+        "queue_wait": summarize_timings(list(queue_wait_samples)) if queue_wait_samples else None,
+        "stats": admission_stats,
+        "leases": [
+            {
+                "job_id": job_id,
+                "pond_id": lease["job"]["pond_id"],
+                "device_type": lease["device_type"],
+                "holder": lease["holder"],
+                "expires_in": round(lease["expires_at"] - now, 1)
+            }
+            for job_id, lease in inflight_leases.items()
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.put("/admission")
+async def update_admission(limits: Dict[str, Any]):
+    """ปรับขีดจำกัดระหว่างรัน เช่น {"max_inflight": 10, "max_inflight_by_type": {"RSPI1": 6}}"""
+    try:
+        if "max_inflight" in limits:
+            admission_limits["max_inflight"] = int(limits["max_inflight"])
+        if "max_inflight_by_type" in limits:
+            admission_limits["max_inflight_by_type"] = {
+                str(device_type): int(limit) for device_type, limit in limits["max_inflight_by_type"].items()
+            }
+    except (TypeError, ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="ขีดจำกัดต้องเป็นตัวเลข")
+    versions["admission"] += 1
+    print(f"🚦 ปรับ admission limits: {admission_limits}")
+    return {"success": True, "limits": admission_limits}
+
+@app.get("/timings")
+async def get_timings():
+    """percentile เวลาแต่ละช่วงของงาน รวมทั้ง fleet และแยกรายบ่อ (งานที่ล้มเหลวแยกใน failures)"""
+    fleet_samples: Dict[str, List[float]] = {}
+    failure_samples: Dict[str, List[float]] = {}
+    ponds = {}
+    for pond_id, phases in job_timings.items():
+        ponds[pond_id] = {phase: summarize_timings(list(samples)) for phase, samples in phases.items()}
+        for phase, samples in phases.items():
+            fleet_samples.setdefault(phase, []).extend(samples)
+    for phases in failed_job_timings.values():
+        for failed_phase, samples in phases.items():
+            failure_samples.setdefault(failed_phase, []).extend(samples)
+
+    fleet = {phase: summarize_timings(samples) for phase, samples in fleet_samples.items()}
+    # ช่วงที่ p50 สูงสุด (ไม่นับ total) = คอขวดของ fleet
+    phase_p50 = {phase: st["p50"] for phase, st in fleet.items() if phase != "total"}
+    bottleneck = max(phase_p50, key=phase_p50.get) if phase_p50 else None
+
+    return {
+        "fleet": fleet,
+        "bottleneck": bottleneck,
+        "failures": {phase: summarize_timings(samples) for phase, samples in failure_samples.items()},
+        "ponds": ponds,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/timings/{pond_id}")
+async def get_pond_timings(pond_id: int):
+    """percentile เวลาแต่ละช่วงของงานของบ่อนี้"""
+    phases = job_timings.get(pond_id) or {}
+    failures = failed_job_timings.get(pond_id) or {}
+    if not phases and not failures:
+        raise HTTPException(status_code=404, detail=f"ยังไม่มีข้อมูลเวลาของบ่อ {pond_id}")
+    return {
+        "pond_id": pond_id,
+        "phases": {phase: summarize_timings(list(samples)) for phase, samples in phases.items()},
+        "failures": {phase: summarize_timings(list(samples)) for phase, samples in failures.items()},
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/status")
+async def get_status(response: Response, if_none_match: Optional[str] = Header(None)):
+    """ดูสถานะระบบ (สร้างใหม่เฉพาะเมื่อข้อมูลเปลี่ยน, 304 ถ้า ETag ตรง)"""
+    expire_leases()
+    etag = f'W/"{BOOT_ID}.status.{versions["state"]}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if status_cache["version"] != versions["state"]:
+        pending_job_list = pending_ponds(DEVICE_TYPE_CAPABILITIES["RSPI1"])
+        pending_job_RSPI2_list = pending_ponds(DEVICE_TYPE_CAPABILITIES["RSPI2"])
+        status_cache["body"] = {
+            "pending_jobs": len(pending_job_list),
+            "pending_job_RSPI2": len(pending_job_RSPI2_list),
+            "completed_jobs": len(completed_jobs),
+            "pending_job_list": pending_job_list,
+            "pending_job_RSPI2_list": pending_job_RSPI2_list,
+            "completed_job_list": list(completed_jobs.keys()),
+            "pending_by_capability": {cap: count for cap, count in sorted(pending_counts.items()) if count},
+            "registered_devices": len(devices),
+            "inflight_jobs": len(inflight_leases),
+        }
+        status_cache["version"] = versions["state"]
+
+    response.headers["ETag"] = etag
+    return {**status_cache["body"], "timestamp": datetime.now().isoformat()}
+
 @app.get("/health")
 async def health_check():
     """Health check สำหรับ Railway"""
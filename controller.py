@@ -2,15 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import time
+import threading
+from startup import Startup
+
+# จับเวลาตั้งแต่เริ่มโปรแกรม: cv2/GPIO โหลดเบื้องหลังหลังเริ่มถามงานแล้ว (ดู startup.py)
+startup = Startup()
+
 import requests
-import cv2
-import RPi.GPIO as GPIO
 import os
+import importlib
 from datetime import datetime
-import RPi.GPIO as GPIO
+from pi_log import make_logger
+import sensor_cache
+import hardware
+from job_timing import JobTimer
+from adaptive_poll import PollScheduler
 import json
-import cv2
-import requests
+import uuid
+import hashlib
+
+startup.record("imports", time.monotonic() - startup.started)
 
 
 # === CONFIG ===
@@ -22,9 +33,26 @@ INB = 24
 relay_pin = 26
 LOG_PATH = "/tmp/controller_debug.log"
 POND_ID = 1
+DEVICE_ID = f"raspi_pond_{POND_ID}"
+DEVICE_TYPE = "RSPI1"
+DEVICE_CAPABILITIES = ["lift", "camera"]  # cloud ส่งงานที่ต้องใช้ capability เหล่านี้มาให้
 BACKEND_URL = "http://192.168.1.60:3000/api/pond-status/{POND_ID}"
-JOB_CHECK_INTERVAL = 5  # วินาที
+JOB_CHECK_INTERVAL = 5  # วินาที (ค่าเริ่มต้น ถ้า cloud ไม่ได้ส่ง next_poll_seconds มา)
+JOB_CHECK_FAST = 2       # วินาที: ช่วงที่เพิ่งมีงาน
+JOB_CHECK_MAX = 60       # วินาที: ห่างสุดตอนเงียบ/ต่อ cloud ไม่ได้
+COMPLETE_RETRIES = 4     # จำนวนครั้งที่ลองแจ้งงานเสร็จ (ใช้ Idempotency-Key เดิมทุกครั้ง)
 FRONT_API_URL = "https://main-two-peach.vercel.app"
+MEDIA_DIR = "/home/rwb/depa"  # ที่เก็บภาพ/วิดีโอก่อนส่ง
+CLOUD_MEDIA_KINDS = ("thumbnail", "image")  # ชนิดไฟล์ที่ส่งเก็บใน cloud_app ด้วย (เพิ่ม "video" ได้ถ้า uplink พอ)
+CAPTURE_PROFILE = "analysis"  # full / analysis / low_bandwidth (ดู media_profiles.py)
+CAPTURE_ROI = None            # (left, top, right, bottom) สัดส่วน 0-1 หรือ None = ทั้งภาพ
+RECORDING_MODE = "adaptive"   # adaptive = หยุดเมื่อยอนิ่ง / fixed = 5 วินาทีเสมอแบบเดิม (ดู recording_gate.py)
+RECORDING_SETTINGS = {
+    "min_seconds": 1.5,       # ถ่ายอย่างน้อย
+    "max_seconds": 5.0,       # ถ่ายอย่างมาก (เท่าโหมด fixed เดิม ไม่ยาวกว่าเดิม)
+    "stable_seconds": 1.0,    # ภาพต้องนิ่งต่อเนื่องนานเท่านี้จึงหยุด
+    "motion_threshold": 1.5   # motion score (0-255) ที่ถือว่านิ่ง
+}
 
 # 👉 เปลี่ยนเป็น URL ของ cloud app ที่ deploy บน Railway
 CLOUD_API_URL = "https://rspi1-production.up.railway.app"  # เปลี่ยนเป็น URL จริง
@@ -33,45 +61,62 @@ CLOUD_API_URL = "https://rspi1-production.up.railway.app"  # เปลี่ย
 BACKEND_URL = "https://railwayreal555-production-5be4.up.railway.app/process"
 
 # === LOG FUNCTION ===
-def log(msg):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_PATH, "a") as f:
-        f.write(f"[{timestamp}] {msg}\n")
-    print(f"[{timestamp}] {msg}")
+# เขียนผ่าน buffer + thread เบื้องหลัง (rotate/gzip อัตโนมัติ) ดู pi_log.py
+log = make_logger(LOG_PATH)
 
 # === SETUP GPIO ===
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-GPIO.setup(LIMIT_SWITCH_PIN, GPIO.IN)
-GPIO.setup(PWM, GPIO.OUT)
-GPIO.setup(INA, GPIO.OUT)
-GPIO.setup(INB, GPIO.OUT)
-GPIO.setup(relay_pin, GPIO.OUT)
-GPIO.output(relay_pin, GPIO.HIGH)
+# RPi.GPIO ของจริง หรือ GPIO จำลองเมื่อรันด้วย SHRIMP_HW=sim (ดู hardware.py)
+# ตั้งค่าขาครั้งแรกที่ใช้ (main() สั่ง preload ไว้ตั้งแต่เริ่ม ปกติจึงเสร็จก่อนมีงาน)
+def setup_gpio():
+    GPIO = hardware.load_gpio()
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setwarnings(False)
+    GPIO.setup(LIMIT_SWITCH_PIN, GPIO.IN)
+    GPIO.setup(PWM, GPIO.OUT)
+    GPIO.setup(INA, GPIO.OUT)
+    GPIO.setup(INB, GPIO.OUT)
+    GPIO.setup(relay_pin, GPIO.OUT)
+    GPIO.output(relay_pin, GPIO.HIGH)
+    hardware.wire_limit_switch(GPIO, LIMIT_SWITCH_PIN, PWM, INA, INB)
+    return GPIO
+
+def gpio():
+    return startup.get("gpio")
+
+# ลำดับนี้คือลำดับ preload: GPIO ก่อน (ปิด relay ให้เร็วที่สุด) แล้วจึง cv2 ที่ใช้เวลาหลายวินาทีบน Pi
+startup.register("gpio", setup_gpio)
+startup.register("cv2", lambda: importlib.import_module("cv2"))
+startup.register("media_profiles", lambda: importlib.import_module("media_profiles"))
+startup.register("recording_gate", lambda: importlib.import_module("recording_gate"))
 
 # === MOTOR CONTROL FUNCTIONS ===
 def pull_down():
+    GPIO = gpio()
     GPIO.output(PWM, 10)
     GPIO.output(INA, GPIO.HIGH)
     GPIO.output(INB, GPIO.LOW)
 
 def pull_up():
+    GPIO = gpio()
     GPIO.output(PWM, 10)
     GPIO.output(INA, GPIO.LOW)
     GPIO.output(INB, GPIO.HIGH)
 
 def stop_motor():
+    GPIO = gpio()
     GPIO.output(PWM, 0)
     GPIO.output(INA, GPIO.HIGH)
     GPIO.output(INB, GPIO.LOW)
         
 def wait_for_press():
+    GPIO = gpio()
     while True:
         if GPIO.input(LIMIT_SWITCH_PIN) == 0:
             break
         time.sleep(0.1)
 
 def wait_for_release():
+    GPIO = gpio()
     while GPIO.input(LIMIT_SWITCH_PIN) == 0:
         time.sleep(0.01)
 
@@ -107,45 +152,140 @@ def send_status(indexStatus: int):
 
 
 # === CLOUD API FUNCTIONS ===
+# ระยะเวลาถามงานครั้งถัดไป: ตาม next_poll_seconds จาก cloud, เคารพ Retry-After เสมอ
+poller = PollScheduler(
+    base_interval=JOB_CHECK_INTERVAL,
+    fast_interval=JOB_CHECK_FAST,
+    max_interval=JOB_CHECK_MAX
+)
+
+# ผลการถามงานครั้งล่าสุด: ส่ง ETag กลับไปใน If-None-Match ถ้า cloud ตอบ 304 = ใช้ผลเดิม
+last_poll = {"etag": None, "has_job": False, "job_data": None, "readiness_state": None}
+
+def etag_boot_id(etag):
+    """BOOT_ID ของ cloud_app ที่อยู่หน้า ETag (W/"{BOOT_ID}.{pond}.{ver}") หรือ None"""
+    if not etag:
+        return None
+    return etag.split('"')[1].split(".")[0] if '"' in etag else None
+
 def check_for_job():
-    """ตรวจสอบว่ามีงานจาก cloud หรือไม่"""
+    """ส่ง heartbeat ไป cloud และรับงานที่ค้างกลับมาในคำขอเดียวกัน"""
     try:
-        response = requests.get(f"{CLOUD_API_URL}/job/{POND_ID}", timeout=5)
-        if response.status_code == 200:
+        beat = {
+            "device_id": DEVICE_ID,
+            "pond_id": POND_ID,
+            "device_type": DEVICE_TYPE,
+            "capabilities": DEVICE_CAPABILITIES,
+            "status": "online",
+            "timestamp": datetime.now().isoformat()
+        }
+        readiness = startup.report()
+        if last_poll["etag"] is None or readiness["state"] != last_poll["readiness_state"]:
+            beat["readiness"] = readiness  # ส่งเฉพาะตอนสถานะเริ่มระบบเปลี่ยน หรือ cloud ยังไม่รู้จักเรา
+        headers = {"If-None-Match": last_poll["etag"]} if last_poll["etag"] else {}
+
+        response = requests.post(f"{CLOUD_API_URL}/heartbeat", json=beat, headers=headers, timeout=5)
+        if response.status_code in (200, 304):
+            last_poll["readiness_state"] = readiness["state"]
+
+        if response.status_code == 304:
+            hint = response.headers.get("X-Next-Poll-Seconds")
+            poller.on_response(last_poll["has_job"], float(hint) if hint else None)
+            return last_poll["has_job"], last_poll["job_data"]
+        elif response.status_code == 200:
             data = response.json()
-            return data.get("has_job", False), data.get("job_data")
+            has_job = data.get("has_job", False)
+            etag = response.headers.get("ETag")
+            if "readiness" not in beat and etag_boot_id(etag) != etag_boot_id(last_poll["etag"]):
+                # cloud restart (BOOT_ID เปลี่ยน) ลืม readiness ไปแล้ว: ส่งซ้ำใน heartbeat ถัดไป
+                last_poll["readiness_state"] = None
+            last_poll.update(etag=etag, has_job=has_job, job_data=data.get("job_data"))
+            if data.get("waiting_reason"):
+                log(f"⏳ มีงานรอคิวอยู่: {data['waiting_reason']}")
+            poller.on_response(has_job, data.get("next_poll_seconds"))
+            return has_job, data.get("job_data")
+        elif response.status_code in (429, 503):
+            retry_after = float(response.headers.get("Retry-After", JOB_CHECK_INTERVAL))
+            log(f"🐢 cloud ขอให้ชะลอ รอ {retry_after:.0f} วินาที")
+            poller.on_throttled(retry_after)
+            return False, None
         else:
             log(f"❌ ตรวจสอบงานล้มเหลว: {response.status_code}")
+            poller.on_error()
             return False, None
     except Exception as e:
         log(f"⚠️ ไม่สามารถเชื่อมต่อ cloud: {e}")
+        poller.on_error()
         return False, None
 
 def complete_job(result_data):
-    """แจ้ง cloud ว่าเสร็จงานแล้ว"""
+    """แจ้ง cloud ว่าเสร็จงานแล้ว (retry ได้ปลอดภัยด้วย Idempotency-Key เดิม)"""
+    idempotency_key = f"{DEVICE_ID}-complete-{uuid.uuid4().hex}"
+    for attempt in range(1, COMPLETE_RETRIES + 1):
+        try:
+            response = requests.post(
+                f"{CLOUD_API_URL}/devices/{DEVICE_ID}/job/complete",
+                json=result_data,
+                headers={"Idempotency-Key": idempotency_key},
+                timeout=5
+            )
+            if response.status_code == 200:
+                log("✅ แจ้งงานเสร็จเรียบร้อย")
+                return True
+            elif response.status_code < 500 and response.status_code != 429:
+                log(f"❌ แจ้งงานเสร็จล้มเหลว: {response.status_code}")
+                return False
+            else:
+                log(f"❌ แจ้งงานเสร็จล้มเหลว: {response.status_code} (ครั้งที่ {attempt}/{COMPLETE_RETRIES})")
+        except Exception as e:
+            log(f"⚠️ ไม่สามารถแจ้งงานเสร็จ: {e} (ครั้งที่ {attempt}/{COMPLETE_RETRIES})")
+
+        if attempt < COMPLETE_RETRIES:
+            time.sleep(2 ** attempt)
+    return False
+
+def upload_media_to_cloud(path, filename, content_type, job_id=None, timeout=60):
+    """ส่งไฟล์ไปเก็บใน cloud_app (/media) ถ้า cloud มีไฟล์ hash เดียวกันอยู่แล้วจะไม่ส่งเนื้อไฟล์ซ้ำ"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    url = f"{CLOUD_API_URL}/media/{POND_ID}"
+    params = {"filename": filename, "sha256": sha256}
+    if job_id is not None:
+        params["job_id"] = job_id  # ให้ cloud ผูกไฟล์กับงานนี้ตรง ๆ
+
     try:
-        response = requests.post(
-            f"{CLOUD_API_URL}/job/{POND_ID}/complete",
-            json=result_data,
-            timeout=5
-        )
-        if response.status_code == 200:
-            log("✅ แจ้งงานเสร็จเรียบร้อย")
-            return True
-        else:
-            log(f"❌ แจ้งงานเสร็จล้มเหลว: {response.status_code}")
-            return False
+        # ถามก่อนด้วย body ว่าง: ถ้า cloud มีไฟล์นี้แล้วจะผูกกับงานให้เลย
+        response = requests.post(url, params=params, headers={"Content-Type": content_type}, timeout=5)
+        if response.status_code == 404:
+            with open(path, "rb") as f:
+                response = requests.post(url, params=params, data=f,
+                                         headers={"Content-Type": content_type}, timeout=timeout)
+        if response.status_code != 200:
+            log(f"❌ ส่ง {filename} ไป cloud ล้มเหลว: {response.status_code}")
+            return None
+
+        media = response.json()
+        log(f"{'♻️ cloud มี' if media.get('duplicate') else '✅ ส่ง'} {filename} แล้ว ({media.get('size')} bytes)")
+        return {"sha256": sha256, "filename": filename, "url": media.get("url")}
     except Exception as e:
-        log(f"⚠️ ไม่สามารถแจ้งงานเสร็จ: {e}")
-        return False
+        log(f"⚠️ ส่ง {filename} ไป cloud ไม่สำเร็จ: {e}")
+        return None
+
+def open_camera(camera_indices=[0, 1, 2], profile=None):
+    """ลองเปิดกล้องตาม index ที่ส่งมา เลือกกล้องแรกที่อ่าน frame ได้
 
-def open_camera(camera_indices=[0, 1, 2]):
-    """ลองเปิดกล้องตาม index ที่ส่งมา เลือกกล้องแรกที่อ่าน frame ได้"""
+    profile: ตั้งความละเอียดตามโปรไฟล์ (media_profiles) ก่อนอ่านภาพแรก
+    """
     for idx in camera_indices:
-        cap = cv2.VideoCapture(idx, cv2.CAP_V4L2)
+        cap = hardware.open_video_capture(idx)  # ของจริงใช้ cv2.CAP_V4L2
         time.sleep(2)  # รอให้กล้องพร้อม
 
         if cap.isOpened():
+            if profile is not None:
+                startup.get("media_profiles").apply_capture_settings(cap, profile)
             ret, frame = cap.read()
             if ret:
                 log(f"✅ ใช้กล้อง index {idx}")
@@ -160,94 +300,132 @@ def open_camera(camera_indices=[0, 1, 2]):
 def execute_lift_job(job_data=None):
     """ทำงานยกเชือกและถ่ายรูป"""
     log("🔧 เริ่มทำงานยกเชือก...")
-    
+    timer = JobTimer()  # เวลาแต่ละช่วงส่งไป cloud ใน result_data["timings"]
+    job_id = (job_data or {}).get("id")  # ส่งไปกับไฟล์ที่อัปโหลด ให้ cloud ผูกกับงานนี้
+
     try:
-        
+        # ปกติใช้เวลา ~0 เพราะ preload เสร็จแล้ว ยกเว้นได้งานทันทีหลัง boot
+        with timer.span("startup_wait"):
+            GPIO = gpio()
+            cv2 = startup.get("cv2")
+            media_profiles = startup.get("media_profiles")
+            recording_gate = startup.get("recording_gate")
 
         # === ถ่ายรูป ===
-        send_status(1)  # ✅ กำลังเตรียมกล้องถ่ายรูป....
-        GPIO.output(relay_pin, GPIO.LOW)
-        time.sleep(3)
+        with timer.span("status_post"):
+            send_status(1)  # ✅ กำลังเตรียมกล้องถ่ายรูป....
+        with timer.span("relay_warmup"):
+            GPIO.output(relay_pin, GPIO.LOW)
+            time.sleep(3)
         log("📷 เตรียมกล้อง...")
 
-        cap = open_camera([0, 1, 2])
-        time.sleep(2)
+        profile = media_profiles.get_profile(CAPTURE_PROFILE, roi=CAPTURE_ROI)
+        with timer.span("camera_open"):
+            cap = open_camera([0, 1, 2], profile)
+            time.sleep(2)
 
         if not cap.isOpened():
             log("❌ ไม่สามารถเปิดกล้องได้")
             raise RuntimeError("เปิดกล้องไม่ได้")
         
         # === ยกยอขึ้น + ถ่ายรูป ===
-        send_status(2)  # ✅ กำลังเริ่มยกยอขึ้น....
+        with timer.span("status_post"):
+            send_status(2)  # ✅ กำลังเริ่มยกยอขึ้น....
         log("⬆️ ยกยอขึ้น")
         start_up_time = time.time()
-        pull_up()
-        wait_for_press()
-        stop_motor()
-        time.sleep(3)
+        with timer.span("lift"):
+            pull_up()
+            wait_for_press()
+            stop_motor()
+        with timer.span("settle"):
+            time.sleep(3)
 
         duration_up = time.time() - start_up_time
         log(f"✅ ยกยอขึ้นเสร็จ (ใช้เวลา {duration_up:.2f} วินาที)")
 
-        frame_width = int(cap.get(3))
-        frame_height = int(cap.get(4))
+        frame_width, frame_height = media_profiles.capture_size(cap)
+        out_width, out_height = media_profiles.output_size(frame_width, frame_height, profile)
         fps = 20.0
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         video_filename = f"video_pond{POND_ID}_{timestamp}.mp4"
         image_filename = f"shrimp_pond{POND_ID}_{timestamp}.jpg"
-        video_path = os.path.join("/home/rwb/depa", video_filename)
-        image_path = os.path.join("/home/rwb/depa", image_filename)
+        thumbnail_filename = f"shrimp_pond{POND_ID}_{timestamp}_thumb.jpg"
+        video_path = os.path.join(MEDIA_DIR, video_filename)
+        image_path = os.path.join(MEDIA_DIR, image_filename)
+        thumbnail_path = os.path.join(MEDIA_DIR, thumbnail_filename)
+        still_sizes = None
+        thumbnail_upload = {}
+        thumbnail_thread = None
 
         os.makedirs(os.path.dirname(video_path), exist_ok=True)
 
         log("🎥 เริ่มถ่ายวิดีโอ")
-        out = cv2.VideoWriter(
-            video_path,
-            cv2.VideoWriter_fourcc(*'mp4v'),
-            fps,
-            (frame_width, frame_height)
-        )
-
-        start_time = time.time()
-        captured_image = None
-
-        stop_motor()
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                log("❌ ไม่สามารถอ่านภาพจากกล้องได้")
-                break
-
-            out.write(frame)
-
-            # Capture still image at 2.5s
-            if captured_image is None and time.time() - start_time > 2.5:
-                captured_image = frame.copy()
-                cv2.imwrite(image_path, captured_image)
+        with timer.span("recording"):  # รวมการถ่ายภาพนิ่งและปิดไฟล์วิดีโอ
+            out = cv2.VideoWriter(
+                video_path,
+                cv2.VideoWriter_fourcc(*'mp4v'),
+                fps,
+                (out_width, out_height)
+            )
+
+            # ตัดสินว่าจะเขียนเฟรมไหน / หยุดเมื่อไหร่ / ใช้เฟรมไหนเป็นภาพนิ่ง
+            gate = recording_gate.RecordingGate(RECORDING_MODE, **RECORDING_SETTINGS)
+            start_time = time.time()
+            # VideoWriter เล่นที่ fps คงที่: ช่องของเฟรมที่ gate ไม่เขียน (ซ้ำกับเฟรมก่อน) เติมด้วยเฟรมล่าสุด
+            # ให้วิดีโอยาวเท่าเวลาจริง การแกว่งของยอในวิดีโอจะได้ไม่เร็วกว่าความจริง
+            last_prepared = None
+            video_frames = 0
+
+            stop_motor()
+
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    log("❌ ไม่สามารถอ่านภาพจากกล้องได้")
+                    break
+
+                write, done = gate.update(frame, time.time() - start_time)
+                while last_prepared is not None and video_frames < int(gate.elapsed * fps):
+                    out.write(last_prepared)
+                    video_frames += 1
+                if write:
+                    last_prepared = media_profiles.prepare_frame(frame, profile)
+                    out.write(last_prepared)
+                    video_frames += 1
+                if done:
+                    log(f"⏱️ หยุดถ่ายหลัง {gate.elapsed:.1f} วินาที ({gate.stop_reason})")
+                    break
+
+            out.release()
+            cap.release()
+
+            captured_image = gate.still_frame()
+            if captured_image is not None:
+                still_sizes = media_profiles.write_still(captured_image, image_path, thumbnail_path, profile)
+                if "thumbnail" in CLOUD_MEDIA_KINDS:
+                    # ส่งภาพย่อทันทีใน thread เบื้องหลัง ให้ dashboard เห็นภาพก่อนงานจบ
+                    thumbnail_thread = threading.Thread(
+                        target=lambda: thumbnail_upload.update(media=upload_media_to_cloud(
+                            thumbnail_path, thumbnail_filename, "image/jpeg", job_id, timeout=10)),
+                        name="thumbnail-upload", daemon=True)
+                    thumbnail_thread.start()
                 send_status(3)  # ✅ ถ่ายสำเร็จ...
                 log(f"📸 ถ่ายภาพนิ่งแล้ว → {image_path}")
 
-            # Stop recording after 5s
-            if time.time() - start_time > 5:
-                log("⏱️ ครบ 5 วินาที หยุดถ่าย")
-                break
-
-        out.release()
-        cap.release()
-
         GPIO.output(relay_pin, GPIO.HIGH)
 
         # === ยกยอลง ===
         log("⬇️ ยกยอลง")
-        pull_down()
-        time.sleep(10)  # ยกลง 10 วินาที
-        stop_motor()
+        with timer.span("lowering"):
+            pull_down()
+            time.sleep(10)  # ยกลง 10 วินาที
+            stop_motor()
         log("✅ ยกยอลงเสร็จ")
 
         # === ส่งไฟล์ไป backend ===
-        send_status(4)  # ✅ กรุณารอข้อมูลสักครู่...
+        with timer.span("status_post"):
+            send_status(4)  # ✅ กรุณารอข้อมูลสักครู่...
         result_data = {
             "status": "success",
             "pond_id": POND_ID,
@@ -255,14 +433,31 @@ def execute_lift_job(job_data=None):
             "timestamp": timestamp,
             "files": {
                 "image": image_filename,
+                "thumbnail": thumbnail_filename,
                 "video": video_filename
+            },
+            # สภาพน้ำล่าสุดจาก sent_data.py (อ่านจาก shared memory, None ถ้าไม่มี)
+            "water_conditions": sensor_cache.read_latest(),
+            # ความยาววิดีโอและจำนวนเฟรมที่เขียน/ข้าม (ดู recording_gate.py)
+            # video_frames = เฟรมในไฟล์รวมเฟรมที่เติมแทนเฟรมที่ข้าม (video_frames / video_fps ≈ duration)
+            "recording": {**gate.summary(), "video_frames": video_frames, "video_fps": fps},
+            # ขนาดไฟล์ก่อน/หลังเตรียมตามโปรไฟล์
+            "media_sizes": {
+                "profile": profile["name"],
+                "image": still_sizes,
+                "video": {
+                    "original_resolution": [frame_width, frame_height],
+                    "resolution": [out_width, out_height],
+                    "bytes": os.path.getsize(video_path) if os.path.exists(video_path) else None
+                }
             }
         }
+        log(f"📦 ขนาดไฟล์ ({profile['name']}): {result_data['media_sizes']}")
 
         if captured_image is not None:
             log("📤 กำลังส่งภาพและวิดีโอไปยังเซิร์ฟเวอร์...")
             try:
-                with open(image_path, "rb") as img_f, open(video_path, "rb") as vid_f:
+                with timer.span("upload"), open(image_path, "rb") as img_f, open(video_path, "rb") as vid_f:
                     files = [
                         ("files", (image_filename, img_f, "image/jpeg")),
                         ("files", (video_filename, vid_f, "video/mp4"))
@@ -283,7 +478,22 @@ def execute_lift_job(job_data=None):
             log("⚠️ ไม่มีภาพนิ่งจะส่ง")
             result_data["backend_error"] = "ไม่มีภาพนิ่งจะส่ง"
 
-        send_status(5)  # ✅ สำเร็จ!!....
+        # เก็บสำเนาไว้ใน cloud_app ให้ dashboard แสดงผล (ไฟล์ซ้ำไม่ถูกส่งซ้ำ)
+        with timer.span("cloud_media"):
+            media = []
+            if thumbnail_thread is not None:
+                thumbnail_thread.join()
+                media.append(thumbnail_upload.get("media"))
+            if captured_image is not None and "image" in CLOUD_MEDIA_KINDS:
+                media.append(upload_media_to_cloud(image_path, image_filename, "image/jpeg", job_id))
+            if "video" in CLOUD_MEDIA_KINDS and os.path.exists(video_path):
+                media.append(upload_media_to_cloud(video_path, video_filename, "video/mp4", job_id))
+            result_data["media"] = [item for item in media if item is not None]
+
+        with timer.span("status_post"):
+            send_status(5)  # ✅ สำเร็จ!!....
+        result_data["timings"] = timer.report()
+        log(f"⏱️ เวลาแต่ละช่วง: {result_data['timings']}")
         return result_data
 
     except Exception as e:
@@ -292,29 +502,43 @@ def execute_lift_job(job_data=None):
             "status": "error",
             "pond_id": POND_ID,
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "timings": timer.report()
         }
 
 # === HEARTBEAT FUNCTION ===
-# Heartbeat ถูกย้ายไปไฟล์ heartbeat.py แยกต่างหาก
+# check_for_job() ส่ง heartbeat ไป cloud_app ทุกรอบอยู่แล้ว
+# heartbeat.py ยังใช้ส่งไปยัง backend ประมวลผลแยกต่างหาก
 
 # === MAIN LOOP ===
 def main():
     log("🔌 เริ่มโปรแกรม controller.py (Cloud Mode)")
     log(f"🌐 Cloud API: {CLOUD_API_URL}")
-    log(f"🔄 ตรวจสอบงานทุก {JOB_CHECK_INTERVAL} วินาที")
-    log("💓 Heartbeat ทำงานแยกในไฟล์ heartbeat.py")
+    log(f"🔄 ตรวจสอบงานทุก {JOB_CHECK_FAST}-{JOB_CHECK_MAX} วินาที (ตามที่ cloud แนะนำ)")
+    log("💓 การถามงานแต่ละครั้งเป็น heartbeat ไปยัง cloud ด้วย")
+
+    # เริ่มถามงานได้เลย ส่วน GPIO/cv2 โหลดใน thread เบื้องหลัง
+    startup.preload("gpio", "cv2", "media_profiles", "recording_gate")
+    startup.mark_polling()
+    log(f"🚀 พร้อมถามงานหลังเริ่มโปรแกรม {startup.phases['time_to_poll']:.2f} วินาที")
+    startup_logged = False
     
     try:
         while True:
             # ตรวจสอบว่ามีงานหรือไม่
             has_job, job_data = check_for_job()
+
+            if not startup_logged and startup.state() in ("ready", "degraded"):
+                report = startup.report()
+                log(f"{'✅' if report['state'] == 'ready' else '⚠️'} สถานะเริ่มระบบ: {report['state']} {report['phases']} {report['components']}")
+                startup_logged = True
             
             if has_job:
                 log(f"📋 พบงานใหม่: {job_data}")
                 
                 # ทำงาน
                 result = execute_lift_job(job_data)
+                result["job_id"] = job_data.get("id")
                 
                 # แจ้งว่าเสร็จแล้ว
                 complete_job(result)
@@ -324,15 +548,16 @@ def main():
                 log("😴 ไม่มีงาน รอ...")
             
             # รอก่อนตรวจสอบครั้งต่อไป
-            time.sleep(JOB_CHECK_INTERVAL)
+            time.sleep(poller.next_delay())
             
     except KeyboardInterrupt:
         log("🛑 หยุดโปรแกรมโดยผู้ใช้")
     except Exception as e:
         log(f"🔥 ERROR: {e}")
     finally:
-        GPIO.cleanup()
-        log("🔚 เคลียร์ GPIO แล้ว")
+        if startup.is_loaded("gpio"):
+            gpio().cleanup()
+            log("🔚 เคลียร์ GPIO แล้ว")
 
 if __name__ == "__main__":
     main()
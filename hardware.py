@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hardware abstraction layer สำหรับสคริปต์ฝั่ง Raspberry Pi
+
+เลือก backend ด้วย environment variable SHRIMP_HW:
+    SHRIMP_HW=real (ค่าเริ่มต้น) -> RPi.GPIO, ADS1115 (board/busio), W1ThermSensor, cv2.VideoCapture
+    SHRIMP_HW=sim                -> ฮาร์ดแวร์จำลองทั้งหมด รันบน Linux ทั่วไป/CI ได้
+
+ตั้งค่าฮาร์ดแวร์จำลองเพิ่มเติม:
+    SHRIMP_SIM_FPS, SHRIMP_SIM_WIDTH, SHRIMP_SIM_HEIGHT  กล้องจำลอง (ค่าเริ่มต้น 20 fps, 640x480)
+    SHRIMP_SIM_CAMERAS                                  index กล้องที่ "เสียบอยู่" เช่น "0" หรือ "1,2"
+    SHRIMP_SIM_CAMERA_OPEN_DELAY                        วินาทีที่ใช้เปิดกล้อง
+    SHRIMP_SIM_LIFT_TIME                                วินาทีที่ยอใช้ยกขึ้นจนชน limit switch
+    SHRIMP_SIM_SETTLE_TIME                              ค่าคงที่เวลา (วินาที) ที่ยอในภาพกล้องจำลองแกว่งจนนิ่ง
+                                                        (ค่าเริ่มต้น 1.0: โหมด adaptive หยุดเพราะภาพนิ่งก่อน max_seconds)
+"""
+
+import math
+import os
+import threading
+import time
+
+BACKEND = os.environ.get("SHRIMP_HW", "real").lower()
+
+
+def is_simulated():
+    return BACKEND == "sim"
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# === SIMULATED GPIO ===
+class SimGPIO:
+    """จำลอง API ของ RPi.GPIO ที่โปรเจคนี้ใช้"""
+
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    PUD_OFF = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mode = None
+        self.modes = {}
+        self.levels = {}
+        self.inputs = {}      # pin -> callable ที่คืนค่า 0/1
+        self.listeners = []   # callable(pin, value) ถูกเรียกทุกครั้งที่ output เปลี่ยน
+        self.switches = []    # SimLimitSwitch ที่ต่อกับ GPIO นี้
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.modes[pin] = direction
+            if direction == self.OUT:
+                self.levels[pin] = self.LOW if initial is None else initial
+
+    def output(self, pin, value):
+        with self._lock:
+            self.levels[pin] = value
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(pin, value)
+
+    def input(self, pin):
+        source = self.inputs.get(pin)
+        if source is not None:
+            return source()
+        return self.levels.get(pin, self.HIGH)
+
+    def cleanup(self, *pins):
+        with self._lock:
+            for pin in pins or list(self.modes):
+                self.modes.pop(pin, None)
+                self.levels.pop(pin, None)
+
+
+class SimLimitSwitch:
+    """limit switch ที่ถูกกด (อ่านได้ 0) เมื่อมอเตอร์ยกยอขึ้นนานครบ lift_time"""
+
+    def __init__(self, gpio, pin, pwm, ina, inb, lift_time):
+        self.gpio = gpio
+        self.pin = pin
+        self.pwm, self.ina, self.inb = pwm, ina, inb
+        self.lift_time = lift_time
+        self.position = 0.0   # 0 = ยอลงสุด, lift_time = ชน limit switch
+        self._direction = 0
+        self._updated_at = time.monotonic()
+        gpio.inputs[pin] = self.read
+        gpio.listeners.append(self._on_output)
+        gpio.switches.append(self)
+
+    def _motor_direction(self):
+        levels = self.gpio.levels
+        if not levels.get(self.pwm):
+            return 0
+        if levels.get(self.ina) == SimGPIO.LOW and levels.get(self.inb) == SimGPIO.HIGH:
+            return 1    # pull_up
+        if levels.get(self.ina) == SimGPIO.HIGH and levels.get(self.inb) == SimGPIO.LOW:
+            return -1   # pull_down
+        return 0
+
+    def _advance(self):
+        now = time.monotonic()
+        self.position += self._direction * (now - self._updated_at)
+        self.position = min(max(self.position, 0.0), self.lift_time)
+        self._updated_at = now
+
+    def _on_output(self, pin, value):
+        if pin in (self.pwm, self.ina, self.inb):
+            self._advance()
+            self._direction = self._motor_direction()
+
+    def reset(self):
+        """วางยอกลับที่ลงสุด (ใช้ใน benchmark ให้ทุกรอบเริ่มจากตำแหน่งเดียวกัน)"""
+        self.position = 0.0
+        self._updated_at = time.monotonic()
+        self._direction = self._motor_direction()
+
+    def read(self):
+        self._advance()
+        return 0 if self.position >= self.lift_time else 1
+
+
+# === SIMULATED ADC (ADS1115) ===
+class SimAnalogIn:
+    """จำลอง adafruit AnalogIn: มี .voltage และ .value"""
+
+    def __init__(self, base_voltage, noise=0.01, period=600.0, conversion_time=0.008):
+        self.base_voltage = base_voltage
+        self.noise = noise
+        self.period = period
+        self.conversion_time = conversion_time
+        self._t0 = time.monotonic()
+
+    @property
+    def voltage(self):
+        time.sleep(self.conversion_time)
+        t = time.monotonic() - self._t0
+        drift = 0.05 * self.base_voltage * math.sin(2 * math.pi * t / self.period)
+        jitter = self.noise * math.sin(t * 7.3)
+        return self.base_voltage + drift + jitter
+
+    @property
+    def value(self):
+        return int(self.voltage / 4.096 * 32767)
+
+
+# === SIMULATED 1-WIRE (DS18B20) ===
+class SimThermSensor:
+    """จำลอง W1ThermSensor (แปลงค่าใช้เวลา ~750 ms เหมือนของจริง)"""
+
+    def __init__(self, base_temperature=29.0, conversion_time=0.75):
+        self.base_temperature = base_temperature
+        self.conversion_time = conversion_time
+        self._t0 = time.monotonic()
+
+    def get_temperature(self):
+        time.sleep(self.conversion_time)
+        t = time.monotonic() - self._t0
+        return self.base_temperature + 0.5 * math.sin(2 * math.pi * t / 3600.0)
+
+
+# === SIMULATED CAMERA ===
+class SimVideoCapture:
+    """จำลอง cv2.VideoCapture: สร้างภาพสังเคราะห์ตาม fps/resolution ที่กำหนด
+
+    ภาพมีการเคลื่อนไหวแบบยอที่แกว่งแล้วค่อย ๆ นิ่ง (แอมพลิจูดลดลงตาม settle_time)
+    """
+
+    def __init__(self, index=0, api=None, fps=None, width=None, height=None, settle_time=None):
+        import numpy as np
+        self._np = np
+
+        available = os.environ.get("SHRIMP_SIM_CAMERAS", "0")
+        self.index = index
+        self.fps = fps or _env_float("SHRIMP_SIM_FPS", 20)
+        self.width = int(width or _env_float("SHRIMP_SIM_WIDTH", 640))
+        self.height = int(height or _env_float("SHRIMP_SIM_HEIGHT", 480))
+        self.settle_time = settle_time if settle_time is not None else _env_float("SHRIMP_SIM_SETTLE_TIME", 1.0)
+        self._opened = str(index) in [s.strip() for s in available.split(",")]
+
+        time.sleep(_env_float("SHRIMP_SIM_CAMERA_OPEN_DELAY", 0.0))
+
+        self._base = self._build_base() if self._opened else None
+        self._started = None
+        self._next_frame_at = None
+
+    def _build_base(self):
+        np = self._np
+        y, x = np.mgrid[0:self.height, 0:self.width]
+        pattern = ((x // 16 + y // 16) % 2) * 60 + (x * 120 // max(self.width, 1))
+        return np.stack([pattern, pattern // 2 + 40, 200 - pattern // 3], axis=-1).astype(np.uint8)
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+
+        now = time.monotonic()
+        if self._started is None or now - self._next_frame_at > 1.0:
+            # อ่านภาพครั้งแรก หรือเว้นช่วงนาน (ระหว่างยกยอ) = ยอเพิ่งขึ้นมาและเริ่มแกว่งใหม่
+            self._started = now
+            self._next_frame_at = now
+        if now < self._next_frame_at:
+            time.sleep(self._next_frame_at - now)
+        self._next_frame_at = max(self._next_frame_at + 1.0 / self.fps, time.monotonic())
+
+        t = time.monotonic() - self._started
+        amplitude = self.width * 0.1 * math.exp(-t / max(self.settle_time, 1e-3))
+        shift = int(amplitude * math.sin(2 * math.pi * 1.5 * t))
+        return True, self._np.roll(self._base, shift, axis=1)
+
+    def get(self, prop):
+        if prop == 3:    # CAP_PROP_FRAME_WIDTH
+            return float(self.width)
+        if prop == 4:    # CAP_PROP_FRAME_HEIGHT
+            return float(self.height)
+        if prop == 5:    # CAP_PROP_FPS
+            return float(self.fps)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == 3:
+            self.width = int(value)
+        elif prop == 4:
+            self.height = int(value)
+        elif prop == 5:
+            self.fps = float(value)
+        else:
+            return False
+        if self._opened and prop in (3, 4):
+            self._base = self._build_base()
+        return True
+
+    def release(self):
+        self._opened = False
+
+
+# === LOADERS ===
+_sim_gpio = None
+
+
+def load_gpio():
+    """คืน module RPi.GPIO (ของจริง) หรือ SimGPIO (จำลอง) ที่ใช้ API เดียวกัน"""
+    global _sim_gpio
+    if is_simulated():
+        if _sim_gpio is None:
+            _sim_gpio = SimGPIO()
+        return _sim_gpio
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+def wire_limit_switch(gpio, pin, pwm, ina, inb):
+    """บอก HAL ว่า limit switch ต่อกับมอเตอร์ขาไหน (ของจริงไม่ต้องทำอะไร)"""
+    if isinstance(gpio, SimGPIO):
+        return SimLimitSwitch(gpio, pin, pwm, ina, inb, _env_float("SHRIMP_SIM_LIFT_TIME", 2.0))
+    return None
+
+
+def load_adc_channels(*channels):
+    """คืน AnalogIn ของ ADS1115 ตามหมายเลข channel (0-3)"""
+    if is_simulated():
+        base_voltages = {0: 1.5, 1: 1.2, 2: 2.0, 3: 1.0}
+        return [SimAnalogIn(base_voltages.get(ch, 1.0)) for ch in channels]
+
+    import board
+    import busio
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+
+    i2c = busio.I2C(board.SCL, board.SDA)
+    ads = ADS.ADS1115(i2c)
+    pins = {0: ADS.P0, 1: ADS.P1, 2: ADS.P2, 3: ADS.P3}
+    return [AnalogIn(ads, pins[ch]) for ch in channels]
+
+
+def load_temp_sensor():
+    """คืน DS18B20 (W1ThermSensor) หรือ SimThermSensor"""
+    if is_simulated():
+        return SimThermSensor()
+    from w1thermsensor import W1ThermSensor
+    return W1ThermSensor()
+
+
+def open_video_capture(index, api=None):
+    """เปิดกล้องตาม index (cv2.VideoCapture หรือ SimVideoCapture)"""
+    if is_simulated():
+        return SimVideoCapture(index, api)
+    import cv2
+    if api is None:
+        api = cv2.CAP_V4L2
+    return cv2.VideoCapture(index, api)
@@ -2,17 +2,15 @@ import requests
 import time
 import os
 from datetime import datetime
+from pi_log import make_logger
 
 # === CONFIG ===
 POND_ID = 1  # <<< ตั้งค่าหมายเลขบ่อ
 LOG_PATH = "/tmp/heartbeat_debug.log"
 
 # === LOG FUNCTION ===
-def log(msg):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_PATH, "a") as f:
-        f.write(f"[{timestamp}] {msg}\n")
-    print(f"[{timestamp}] {msg}")
+# เขียนผ่าน buffer + thread เบื้องหลัง (rotate/gzip อัตโนมัติ) ดู pi_log.py
+log = make_logger(LOG_PATH)
 
 # === HEARTBEAT FUNCTION ===
 def send_heartbeat():
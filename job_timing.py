@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+จับเวลาแต่ละช่วงของงาน (span) ด้วย time.monotonic() สำหรับ controller.py
+
+    timer = JobTimer()
+    with timer.span("camera_open"):
+        cap = open_camera()
+    result_data["timings"] = timer.report()
+
+span ชื่อเดียวกันหลายครั้งจะถูกรวมเวลากัน ถ้าเกิด exception ใน span
+จะบันทึกชื่อ span นั้นไว้ใน failed_phase
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class JobTimer:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}
+        self.order = []
+        self.failed_phase = None
+
+    @contextmanager
+    def span(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            if self.failed_phase is None:
+                self.failed_phase = name
+            raise
+        finally:
+            if name not in self.phases:
+                self.phases[name] = 0.0
+                self.order.append(name)
+            self.phases[name] += time.monotonic() - start
+
+    def report(self):
+        """dict สำหรับแนบไปกับ result_data (หน่วยวินาที)"""
+        report = {
+            "phases": {name: round(self.phases[name], 3) for name in self.order},
+            "total": round(time.monotonic() - self.started, 3)
+        }
+        if self.failed_phase is not None:
+            report["failed_phase"] = self.failed_phase
+        return report
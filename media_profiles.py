@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+โปรไฟล์การถ่ายและเตรียมภาพ/วิดีโอก่อนส่งขึ้น server (ใช้ใน controller.py)
+
+แต่ละโปรไฟล์กำหนด:
+    capture       (w, h) ที่ขอจากกล้อง (MJPG) หรือ None = ใช้ค่าของกล้อง
+                  (ไม่ขอเกินความละเอียดที่กล้องใช้อยู่ ภาพจะได้ไม่ใหญ่ขึ้นกว่าเดิม)
+    roi           (left, top, right, bottom) เป็นสัดส่วน 0-1 ของภาพ หรือ None = ทั้งภาพ
+    max_width     ย่อภาพ/วิดีโอให้กว้างไม่เกินนี้ (หลัง crop) หรือ None = ไม่ย่อ
+    jpeg_quality  คุณภาพ JPEG ของภาพนิ่ง (0-100)
+    thumbnail_width / thumbnail_quality  ภาพย่อสำหรับแสดงบน dashboard ทันที
+"""
+
+import cv2
+
+PROFILES = {
+    # เหมือนพฤติกรรมเดิม: ไม่ crop ไม่ย่อ
+    "full": {
+        "capture": None,
+        "roi": None,
+        "max_width": None,
+        "jpeg_quality": 95,
+        "thumbnail_width": 320,
+        "thumbnail_quality": 70
+    },
+    # ค่าเริ่มต้น: ใช้ความละเอียดของกล้อง ย่อให้กว้างไม่เกิน 640 (พอสำหรับวิเคราะห์กุ้ง)
+    "analysis": {
+        "capture": None,
+        "roi": None,
+        "max_width": 640,
+        "jpeg_quality": 85,
+        "thumbnail_width": 320,
+        "thumbnail_quality": 70
+    },
+    # สำหรับบ่อที่สัญญาณแย่ (ตรงกับที่ test_camera.py ใช้ 640x360 MJPG)
+    "low_bandwidth": {
+        "capture": (640, 360),
+        "roi": None,
+        "max_width": 640,
+        "jpeg_quality": 75,
+        "thumbnail_width": 240,
+        "thumbnail_quality": 60
+    },
+}
+
+
+def get_profile(name, **overrides):
+    """คืนสำเนาโปรไฟล์ตามชื่อ พร้อม override บางค่าได้ เช่น roi=(0.1, 0.2, 0.9, 1.0)"""
+    if name not in PROFILES:
+        raise ValueError(f"ไม่รู้จักโปรไฟล์ {name} (มี: {', '.join(PROFILES)})")
+    profile = dict(PROFILES[name])
+    profile.update(overrides)
+    profile["name"] = name
+    return profile
+
+
+def capture_size(cap):
+    """(w, h) ที่กล้องให้อยู่ตอนนี้"""
+    return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+
+def apply_capture_settings(cap, profile):
+    """ขอความละเอียดจากกล้องตามโปรไฟล์ (เรียกก่อน read() ครั้งแรก) คืน (w, h) ที่กล้องให้จริง
+
+    ถ้าโปรไฟล์ขอใหญ่กว่าที่กล้องใช้อยู่จะไม่เปลี่ยน
+    """
+    current_w, current_h = capture_size(cap)
+    if profile.get("capture"):
+        width, height = profile["capture"]
+        if current_w and current_h and (width > current_w or height > current_h):
+            return current_w, current_h
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return capture_size(cap)
+
+
+def _roi_box(width, height, roi):
+    if not roi:
+        return 0, 0, width, height
+    left, top, right, bottom = roi
+    x0, y0 = int(left * width), int(top * height)
+    x1, y1 = max(x0 + 1, int(right * width)), max(y0 + 1, int(bottom * height))
+    return x0, y0, x1, y1
+
+
+def output_size(width, height, profile):
+    """ขนาด (w, h) หลัง crop + ย่อ ตามโปรไฟล์ (ใช้ตั้ง VideoWriter)"""
+    x0, y0, x1, y1 = _roi_box(width, height, profile.get("roi"))
+    out_w, out_h = x1 - x0, y1 - y0
+    max_width = profile.get("max_width")
+    if max_width and out_w > max_width:
+        out_h = int(out_h * max_width / out_w)
+        out_w = max_width
+    # codec ส่วนใหญ่ต้องการขนาดเป็นเลขคู่
+    return out_w - out_w % 2, out_h - out_h % 2
+
+
+def prepare_frame(frame, profile):
+    """crop ROI และย่อภาพตามโปรไฟล์ (ไม่ copy ถ้าไม่ต้องเปลี่ยนอะไร)"""
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = _roi_box(width, height, profile.get("roi"))
+    if (x0, y0, x1, y1) != (0, 0, width, height):
+        frame = frame[y0:y1, x0:x1]
+
+    target = output_size(width, height, profile)
+    if (frame.shape[1], frame.shape[0]) != target:
+        frame = cv2.resize(frame, target, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _write_jpeg(path, frame, quality):
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise RuntimeError(f"แปลงภาพเป็น JPEG ไม่สำเร็จ: {path}")
+    with open(path, "wb") as f:
+        f.write(encoded.tobytes())
+    return len(encoded)
+
+
+def write_still(frame, image_path, thumbnail_path, profile):
+    """บันทึกภาพนิ่งตามโปรไฟล์ + ภาพย่อ คืนขนาดก่อน/หลังสำหรับรายงาน"""
+    original_h, original_w = frame.shape[:2]
+    ok, original = cv2.imencode(".jpg", frame)  # ขนาดเดิมเมื่อบันทึกด้วย cv2.imwrite ค่าเริ่มต้น
+    original_bytes = len(original) if ok else None
+
+    prepared = prepare_frame(frame, profile)
+    image_bytes = _write_jpeg(image_path, prepared, profile["jpeg_quality"])
+
+    thumb_w = min(profile["thumbnail_width"], prepared.shape[1])
+    thumb_h = max(1, int(prepared.shape[0] * thumb_w / prepared.shape[1]))
+    thumbnail = cv2.resize(prepared, (thumb_w, thumb_h), interpolation=cv2.INTER_AREA)
+    thumbnail_bytes = _write_jpeg(thumbnail_path, thumbnail, profile["thumbnail_quality"])
+
+    return {
+        "original_resolution": [original_w, original_h],
+        "original_bytes": original_bytes,
+        "resolution": [prepared.shape[1], prepared.shape[0]],
+        "bytes": image_bytes,
+        "thumbnail_resolution": [thumb_w, thumb_h],
+        "thumbnail_bytes": thumbnail_bytes
+    }
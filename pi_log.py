@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ตัวเขียน log แบบมี buffer สำหรับสคริปต์ฝั่ง Raspberry Pi
+
+- log() แค่ต่อบรรทัดเข้า buffer ในหน่วยความจำ (ไม่แตะ SD card)
+- thread เบื้องหลัง flush ลงไฟล์เป็นรอบ ๆ หรือเมื่อ buffer เต็ม
+- ไฟล์ใหญ่เกิน max_bytes จะถูก rotate เป็น .1.gz, .2.gz, ... (เก็บไม่เกิน backup_count)
+- flush เสมอตอนโปรแกรมจบ, โดน SIGTERM (systemd stop) หรือ crash
+"""
+
+import atexit
+import gzip
+import os
+import shutil
+import signal
+import threading
+from datetime import datetime
+
+# === CONFIG ===
+DEFAULT_MAX_BYTES = 1 * 1024 * 1024  # 1 MB ต่อไฟล์
+DEFAULT_BACKUP_COUNT = 3
+DEFAULT_FLUSH_INTERVAL = 2.0         # วินาที
+DEFAULT_MAX_BUFFER_LINES = 200       # buffer เต็มเมื่อไหร่ flush ทันที
+
+
+class BufferedLogWriter:
+    """เขียน log ลงไฟล์แบบ batch พร้อม rotate + gzip"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_buffer_lines=DEFAULT_MAX_BUFFER_LINES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.max_buffer_lines = max_buffer_lines
+
+        self._buffer = []
+        self._lock = threading.Lock()        # กัน buffer
+        self._io_lock = threading.Lock()     # กันการเขียนไฟล์/rotate ซ้อนกัน
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="log-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        """เพิ่มหนึ่งบรรทัดเข้า buffer (ไม่ block กับ I/O)"""
+        with self._lock:
+            self._buffer.append(line if line.endswith("\n") else line + "\n")
+            full = len(self._buffer) >= self.max_buffer_lines
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """เขียนทุกบรรทัดที่ค้างใน buffer ลงไฟล์ แล้ว rotate ถ้าจำเป็น"""
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.writelines(lines)
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                print(f"⚠️ เขียน log ลง {self.path} ไม่สำเร็จ: {e}")
+
+    def close(self):
+        """หยุด thread และ flush ครั้งสุดท้าย"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _rotate(self):
+        """path -> path.1.gz, path.1.gz -> path.2.gz, ... (เรียกภายใต้ _io_lock)"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+
+        rotated = f"{self.path}.1"
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as f_in, gzip.open(f"{rotated}.gz", "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(rotated)
+
+
+# === SHUTDOWN HANDLING ===
+def _install_sigterm_handler():
+    """แปลง SIGTERM เป็น SystemExit เพื่อให้ finally/atexit ทำงาน (flush log, GPIO.cleanup)"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+        return
+
+    def _handle_sigterm(signum, frame):
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
+def make_logger(path, **kwargs):
+    """สร้างฟังก์ชัน log(msg) ที่พิมพ์ขึ้นจอและเขียนลงไฟล์ผ่าน BufferedLogWriter"""
+    writer = BufferedLogWriter(path, **kwargs)
+    _install_sigterm_handler()
+
+    def log(msg):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] {msg}"
+        writer.write(line)
+        print(line)
+
+    log.writer = writer
+    return log
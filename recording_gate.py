@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ตัดสินความยาวการถ่ายวิดีโอตามการเคลื่อนไหวในภาพ (ใช้ใน controller.py)
+
+แต่ละเฟรมถูกย่อเหลือกว้าง sample_width px แบบ grayscale แล้วเทียบกับเฟรมก่อนหน้า
+ด้วย cv2.absdiff (ค่าเฉลี่ย 0-255 = motion score)
+
+    adaptive  หยุดเมื่อ score ต่ำกว่า motion_threshold ต่อเนื่องครบ stable_seconds
+              (ไม่ก่อน min_seconds และไม่เกิน max_seconds), ไม่เขียนเฟรมที่แทบไม่ต่างจาก
+              เฟรมล่าสุดที่เขียน (score < duplicate_threshold), ภาพนิ่งใช้เฟรมที่นิ่งที่สุด
+              (controller.py เติมช่องของเฟรมที่ไม่เขียนด้วยเฟรมล่าสุด ให้วิดีโอยาวเท่าเวลาจริง)
+    fixed     แบบเดิม: ถ่าย fixed_seconds วินาที เขียนทุกเฟรม ภาพนิ่งที่ still_at วินาที
+"""
+
+import cv2
+
+
+class RecordingGate:
+    def __init__(self, mode="adaptive", min_seconds=1.5, max_seconds=6.0, stable_seconds=1.0,
+                 motion_threshold=1.5, duplicate_threshold=0.2, sample_width=64,
+                 fixed_seconds=5.0, still_at=2.5):
+        if mode not in ("adaptive", "fixed"):
+            raise ValueError(f"ไม่รู้จักโหมดการถ่าย {mode} (มี: adaptive, fixed)")
+        self.mode = mode
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.stable_seconds = stable_seconds
+        self.motion_threshold = motion_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.sample_width = sample_width
+        self.fixed_seconds = fixed_seconds
+        self.still_at = still_at
+
+        self.previous = None        # เฟรมย่อก่อนหน้า
+        self.last_written = None    # เฟรมย่อของเฟรมล่าสุดที่เขียนลงวิดีโอ
+        self.stable_since = None
+        self.still = None
+        self.still_score = None
+        self.elapsed = 0.0
+        self.frames_read = 0
+        self.frames_written = 0
+        self.score = None
+        self.stop_reason = None
+
+    def _sample(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.sample_width, max(1, height * self.sample_width // width))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    @staticmethod
+    def _difference(a, b):
+        return float(cv2.absdiff(a, b).mean())
+
+    def update(self, frame, elapsed):
+        """ส่งเฟรมที่อ่านได้ + วินาทีตั้งแต่เริ่มถ่าย คืน (write, done)"""
+        self.frames_read += 1
+        self.elapsed = elapsed
+
+        if self.mode == "fixed":
+            if self.still is None and elapsed > self.still_at:
+                self.still = frame.copy()
+            self.frames_written += 1
+            if elapsed > self.fixed_seconds:
+                self.stop_reason = "fixed"
+                return True, True
+            return True, False
+
+        sample = self._sample(frame)
+        self.score = self._difference(self.previous, sample) if self.previous is not None else None
+        self.previous = sample
+
+        if self.score is not None and self.score < self.motion_threshold:
+            if self.stable_since is None:
+                self.stable_since = elapsed
+        else:
+            self.stable_since = None
+
+        # ภาพนิ่ง: เก็บเฟรมที่ score ต่ำสุด (copy เฉพาะตอนได้เฟรมที่นิ่งกว่าเดิม)
+        if self.score is not None and (self.still_score is None or self.score < self.still_score):
+            self.still = frame.copy()
+            self.still_score = self.score
+
+        write = self.last_written is None or self._difference(self.last_written, sample) >= self.duplicate_threshold
+        if write:
+            self.last_written = sample
+            self.frames_written += 1
+
+        if elapsed >= self.max_seconds:
+            self.stop_reason = "max_seconds"
+            return write, True
+        if (elapsed >= self.min_seconds and self.stable_since is not None
+                and elapsed - self.stable_since >= self.stable_seconds):
+            self.stop_reason = "stable"
+            return write, True
+        return write, False
+
+    def still_frame(self, fallback=None):
+        """เฟรมสำหรับภาพนิ่ง (None ถ้ายังไม่มีเฟรมที่ใช้ได้)"""
+        return self.still if self.still is not None else fallback
+
+    def summary(self):
+        """dict สำหรับแนบไปกับ result_data"""
+        return {
+            "mode": self.mode,
+            "duration": round(self.elapsed, 3),
+            "frames_read": self.frames_read,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_read - self.frames_written,
+            "stop_reason": self.stop_reason,
+            "stable_since": round(self.stable_since, 3) if self.stable_since is not None else None,
+            "last_score": round(self.score, 3) if self.score is not None else None
+        }
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+แคชค่าเซนเซอร์ล่าสุดใน shared memory (mmap) สำหรับโปรเซสบน Pi เครื่องเดียวกัน
+
+sent_data.py เป็นผู้เขียน (SensorCacheWriter) ส่วน controller.py อ่านผ่าน read_latest()
+โดยไม่ต้องเปิด/parse ไฟล์ JSON ทุกครั้ง
+
+Layout (little-endian, ขนาดคงที่):
+    header  : magic(4s) version(I) pond_id(I) capacity(I) seq(Q) written(Q)   = 32 bytes
+    records : capacity x [ts(d) ph(d) temperature(d) do(d)]                   = 32 bytes ต่อช่อง
+
+seq เป็น sequence lock: ผู้เขียนทำให้เป็นเลขคี่ก่อนเขียน แล้วเป็นเลขคู่เมื่อเขียนเสร็จ
+ผู้อ่าน copy ข้อมูลแล้วเช็คว่า seq ไม่เปลี่ยนและเป็นเลขคู่ ถ้าไม่ใช่ก็อ่านใหม่ (ไม่ต้องใช้ lock)
+ค่าที่อ่านไม่ได้เก็บเป็น NaN และคืนเป็น None
+"""
+
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+# === CONFIG ===
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+CACHE_PATH = os.path.join(SHM_DIR, "shrimp_sensor_cache.bin")
+HISTORY_SIZE = 120  # 120 ช่อง x 5 วินาที = ประมาณ 10 นาที
+
+MAGIC = b"SHRC"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")
+RECORD = struct.Struct("<dddd")
+SEQ_OFFSET = 16
+MAX_READ_RETRIES = 100
+
+
+def _region_size(capacity):
+    return HEADER.size + capacity * RECORD.size
+
+
+def _to_float(value):
+    return float("nan") if value is None else float(value)
+
+
+def _from_float(value):
+    return None if math.isnan(value) else value
+
+
+# === WRITER (sent_data.py) ===
+class SensorCacheWriter:
+    """เขียนค่าล่าสุด + ประวัติสั้น ๆ ลง ring buffer ใน mmap"""
+
+    def __init__(self, pond_id, path=CACHE_PATH, capacity=HISTORY_SIZE):
+        self.path = path
+        self.capacity = capacity
+        size = _region_size(capacity)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._seq = 0
+        self._written = 0
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, pond_id, capacity, self._seq, self._written)
+
+    def publish(self, ph, temperature, do, ts=None):
+        """บันทึกค่าชุดใหม่ (None = อ่านค่าไม่ได้)"""
+        ts = time.time() if ts is None else ts
+        slot = self._written % self.capacity
+
+        self._seq += 1  # คี่ = กำลังเขียน
+        struct.pack_into("<Q", self._mm, SEQ_OFFSET, self._seq)
+        RECORD.pack_into(self._mm, HEADER.size + slot * RECORD.size,
+                         ts, _to_float(ph), _to_float(temperature), _to_float(do))
+        self._written += 1
+        struct.pack_into("<Q", self._mm, SEQ_OFFSET + 8, self._written)
+        self._seq += 1  # คู่ = เขียนเสร็จ
+        struct.pack_into("<Q", self._mm, SEQ_OFFSET, self._seq)
+
+    def close(self):
+        self._mm.close()
+
+
+# === READER (controller.py และโปรเซสอื่น ๆ) ===
+class SensorCacheReader:
+    """อ่านค่าจาก mmap แบบ lock-free (attach ครั้งเดียวแล้วใช้ซ้ำ)"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._mm = None
+
+    def _attach(self):
+        if self._mm is not None:
+            return True
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size:
+                return False
+            self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, _, capacity, _, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or size < _region_size(capacity):
+            self.close()
+            return False
+        return True
+
+    def _snapshot(self, count):
+        """copy header + ช่องล่าสุด count ช่องแบบ consistent"""
+        for _ in range(MAX_READ_RETRIES):
+            _, _, pond_id, capacity, seq1, written = HEADER.unpack_from(self._mm, 0)
+            if seq1 % 2:
+                continue
+            n = min(count, written, capacity)
+            records = [
+                RECORD.unpack_from(self._mm, HEADER.size + ((written - 1 - i) % capacity) * RECORD.size)
+                for i in range(n)
+            ]
+            seq2 = struct.unpack_from("<Q", self._mm, SEQ_OFFSET)[0]
+            if seq1 == seq2:
+                return pond_id, records
+        return None, []
+
+    def history(self, count=HISTORY_SIZE):
+        """ค่าล่าสุด count ชุด เรียงจากใหม่ไปเก่า"""
+        if not self._attach():
+            return []
+        pond_id, records = self._snapshot(count)
+        now = time.time()
+        return [
+            {
+                "pond_id": pond_id,
+                "ph": _from_float(ph),
+                "temperature": _from_float(temperature),
+                "do": _from_float(do),
+                "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+                "age_seconds": round(now - ts, 1)
+            }
+            for ts, ph, temperature, do in records
+        ]
+
+    def latest(self):
+        """ค่าล่าสุด หรือ None ถ้ายังไม่มีข้อมูล"""
+        readings = self.history(1)
+        return readings[0] if readings else None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+_default_reader = None
+
+
+def read_latest():
+    """ค่าสภาพน้ำล่าสุดจาก sent_data.py (ไม่มี I/O หลัง attach ครั้งแรก)"""
+    global _default_reader
+    if _default_reader is None:
+        _default_reader = SensorCacheReader()
+    return _default_reader.latest()
+
+
+def read_history(count=HISTORY_SIZE):
+    """ประวัติค่าสภาพน้ำล่าสุด count ชุด เรียงจากใหม่ไปเก่า"""
+    global _default_reader
+    if _default_reader is None:
+        _default_reader = SensorCacheReader()
+    return _default_reader.history(count)
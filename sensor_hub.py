@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+อ่านเซนเซอร์แบบขนาน: เซนเซอร์แต่ละตัวมี thread และรอบการอ่านของตัวเอง
+
+DS18B20 (1-Wire) ใช้เวลาแปลงค่าประมาณ 750 ms ถ้าอ่านต่อกันใน loop เดียว
+ADS1115 จะต้องรอไปด้วย และ timestamp ของข้อมูลจะเพี้ยน
+SensorHub ให้ loop หลักดึง snapshot ค่าล่าสุดได้ทันทีโดยไม่ block
+พร้อมสถิติ latency และจำนวนครั้งที่อ่านล้มเหลวของแต่ละเซนเซอร์
+"""
+
+import threading
+import time
+
+
+class SensorReader:
+    """อ่านเซนเซอร์หนึ่งตัวซ้ำ ๆ ใน thread ของตัวเอง"""
+
+    def __init__(self, name, read_fn, interval, max_age=None):
+        self.name = name
+        self.read_fn = read_fn
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else interval * 3
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()   # set เมื่ออ่านค่าได้ครั้งแรก
+        self._thread = threading.Thread(target=self._run, name=f"sensor-{name}", daemon=True)
+
+        self._value = None
+        self._read_at = None        # time.time() ตอนได้ค่า
+        self._reads = 0
+        self._failures = 0
+        self._consecutive_failures = 0
+        self._last_error = None
+        self._last_latency = None
+        self._max_latency = 0.0
+        self._total_latency = 0.0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                value = self.read_fn()
+                latency = time.monotonic() - started
+                with self._lock:
+                    self._value = value
+                    self._read_at = time.time()
+                    self._reads += 1
+                    self._consecutive_failures = 0
+                    self._record_latency(latency)
+                self._ready.set()
+            except Exception as e:
+                latency = time.monotonic() - started
+                with self._lock:
+                    self._failures += 1
+                    self._consecutive_failures += 1
+                    self._last_error = f"{type(e).__name__}: {e}"
+                    self._record_latency(latency)
+
+            # นับรอบจากเวลาที่เริ่มอ่าน เพื่อให้ cadence คงที่แม้เซนเซอร์จะช้า
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _record_latency(self, latency):
+        self._last_latency = latency
+        self._max_latency = max(self._max_latency, latency)
+        self._total_latency += latency
+
+    def wait_ready(self, timeout=None):
+        """รอจนได้ค่าแรก คืน True ถ้าได้ค่าภายใน timeout"""
+        return self._ready.wait(timeout)
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def latest(self, now=None):
+        """(value, read_at) ล่าสุด — value เป็น None ถ้ายังไม่มีค่าหรือค่าเก่าเกิน max_age"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._read_at is None or now - self._read_at > self.max_age:
+                return None, self._read_at
+            return self._value, self._read_at
+
+    def stats(self):
+        with self._lock:
+            attempts = self._reads + self._failures
+            return {
+                "reads": self._reads,
+                "failures": self._failures,
+                "consecutive_failures": self._consecutive_failures,
+                "last_error": self._last_error,
+                "last_latency_ms": None if self._last_latency is None else round(self._last_latency * 1000, 1),
+                "avg_latency_ms": round(self._total_latency / attempts * 1000, 1) if attempts else None,
+                "max_latency_ms": round(self._max_latency * 1000, 1),
+                "last_read_at": self._read_at
+            }
+
+
+class SensorHub:
+    """รวมค่าจาก SensorReader หลายตัวเป็น snapshot เดียว"""
+
+    def __init__(self):
+        self.readers = {}
+
+    def add(self, name, read_fn, interval, max_age=None):
+        self.readers[name] = SensorReader(name, read_fn, interval, max_age)
+        return self.readers[name]
+
+    def start(self):
+        for reader in self.readers.values():
+            reader.start()
+
+    def stop(self, timeout=2.0):
+        for reader in self.readers.values():
+            reader.stop(timeout)
+
+    def wait_ready(self, timeout=None):
+        """รอจนทุกเซนเซอร์ได้ค่าแรก คืนรายชื่อเซนเซอร์ที่ยังไม่มีค่า (ว่าง = พร้อมทั้งหมด)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for reader in self.readers.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            reader.wait_ready(remaining)
+        return [name for name, reader in self.readers.items() if not reader.is_ready()]
+
+    def snapshot(self):
+        """ค่าล่าสุดของทุกเซนเซอร์ + เวลาที่อ่านแต่ละค่า (ไม่ block)"""
+        now = time.time()
+        values = {}
+        read_at = {}
+        for name, reader in self.readers.items():
+            values[name], read_at[name] = reader.latest(now)
+        return {"taken_at": now, "values": values, "read_at": read_at}
+
+    def stats(self):
+        return {name: reader.stats() for name, reader in self.readers.items()}
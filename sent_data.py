@@ -1,12 +1,11 @@
 import time
 import json
+import threading
 import requests
 from datetime import datetime
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from w1thermsensor import W1ThermSensor
+import hardware
+from sensor_cache import SensorCacheWriter
+from sensor_hub import SensorHub
 
 # === CONFIG ===
 VREF = 3.3
@@ -16,13 +15,21 @@ PH_C = 0.182
 JSON_FILE = "/tmp/sensor_data.json"
 SERVER_URL = "https://railwayreal555-production-5be4.up.railway.app/data"  # เปลี่ยนเป็น ngrok ของ backend
 POND_ID = 1   # <<< ตั้งค่า pond_id ของบ่อที่อ่านค่า
+SEND_INTERVAL = 5     # วินาที: ส่งข้อมูลไป server
+ADC_INTERVAL = 1.0    # วินาที: รอบอ่าน DO / pH (ADS1115)
+TEMP_INTERVAL = 2.0   # วินาที: รอบอ่าน DS18B20 (แปลงค่าใช้เวลา ~750 ms)
+STATS_EVERY = 12      # พิมพ์สถิติเซนเซอร์ทุก ๆ กี่รอบการส่ง
+STARTUP_WAIT = 10     # วินาที: รอค่าแรกของทุกเซนเซอร์ก่อนเริ่มส่ง (เกินนี้ส่งเท่าที่มี)
 
 # === INIT SENSORS ===
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-do_channel = AnalogIn(ads, ADS.P1)
-ph_channel = AnalogIn(ads, ADS.P2)
-temp_sensor = W1ThermSensor()
+# ADS1115 + DS18B20 ของจริง หรือแบบจำลองเมื่อรันด้วย SHRIMP_HW=sim (ดู hardware.py)
+do_channel, ph_channel = hardware.load_adc_channels(1, 2)
+temp_sensor = hardware.load_temp_sensor()
+i2c_lock = threading.Lock()  # DO กับ pH ใช้ ADS1115 ตัวเดียวกัน ห้ามอ่านพร้อมกัน
+
+# === SHARED MEMORY CACHE ===
+# ให้ controller.py อ่านค่าล่าสุดได้ทันทีโดยไม่ต้อง parse JSON_FILE
+sensor_cache = SensorCacheWriter(POND_ID)
 
 # === CONVERSION FUNCTIONS ===
 def voltage_to_do(voltage):
@@ -31,46 +38,87 @@ def voltage_to_do(voltage):
 def voltage_to_ph(voltage):
     return PH_M * voltage + PH_C
 
+def read_do():
+    with i2c_lock:
+        return voltage_to_do(do_channel.voltage)
+
+def read_ph():
+    with i2c_lock:
+        return voltage_to_ph(ph_channel.voltage)
+
+# === SENSOR THREADS ===
+# แต่ละเซนเซอร์อ่านใน thread ของตัวเอง loop หลักแค่ดึงค่าล่าสุด
+sensors = SensorHub()
+sensors.add("do", read_do, ADC_INTERVAL)
+sensors.add("ph", read_ph, ADC_INTERVAL)
+sensors.add("temperature", temp_sensor.get_temperature, TEMP_INTERVAL)
+
+def rounded(value):
+    return None if value is None else round(value, 2)
+
 # === MAIN LOOP ===
 print("เริ่มอ่านค่า DO, pH และอุณหภูมิ พร้อมส่งไปยังเซิร์ฟเวอร์...")
 
+sensors.start()
+cycle = 0
+
+# รอค่าแรกของทุกเซนเซอร์ไม่เกิน STARTUP_WAIT วินาที เซนเซอร์ที่เสียจะไม่ถ่วงตัวอื่น
+waiting = sensors.wait_ready(timeout=STARTUP_WAIT)
+if waiting:
+    print(f"[WARN] ยังไม่ได้ค่าแรกจาก: {', '.join(waiting)} เริ่มส่งเฉพาะค่าที่มี")
+
 try:
     while True:
-        # อ่านเซนเซอร์
-        do_voltage = do_channel.voltage
-        ph_voltage = ph_channel.voltage
-        temperature = temp_sensor.get_temperature()
-
-        do_value = voltage_to_do(do_voltage)
-        ph_value = voltage_to_ph(ph_voltage)
+        # ดึงค่าล่าสุดของทุกเซนเซอร์ (ไม่ต้องรอ DS18B20)
+        snapshot = sensors.snapshot()
+        values = snapshot["values"]
 
         # สร้างข้อมูล JSON แบบเดียวกับที่ backend ต้องการ
         data = {
             "pond_id": POND_ID,
-            "ph": round(ph_value, 2),
-            "temperature": round(temperature, 2),
-            "do": round(do_value, 2),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "ph": rounded(values["ph"]),
+            "temperature": rounded(values["temperature"]),
+            "do": rounded(values["do"]),
+            "timestamp": datetime.fromtimestamp(snapshot["taken_at"]).strftime("%Y-%m-%d %H:%M:%S")
         }
 
+        # เผยแพร่ค่าล่าสุดลง shared memory
+        sensor_cache.publish(data["ph"], data["temperature"], data["do"], ts=snapshot["taken_at"])
+
         # บันทึกไฟล์ใน Raspi (ไฟล์เดียวล่าสุด)
         try:
             with open(JSON_FILE, "w") as f:
-                json.dump(data, f, indent=2)
+                json.dump({**data, "sensor_stats": sensors.stats()}, f, indent=2)
         except Exception as e:
             print(f"[ERROR] บันทึกไฟล์ JSON ล้มเหลว: {e}")
 
-        # ส่งไปยัง Server
-        try:
-            r = requests.post(SERVER_URL, json=data, timeout=3)
-            if r.status_code == 200:
-                print(f"[OK] ส่งข้อมูลสำเร็จ -> {data}")
-            else:
-                print(f"[WARN] ส่งข้อมูลไม่สำเร็จ: {r.status_code} {r.text}")
-        except Exception as e:
-            print(f"[ERROR] ส่งข้อมูลไม่สำเร็จ: {e}")
+        # ส่งไปยัง Server: ค่าที่ขาด/เก่าเกิน max_age ไม่ใส่ใน payload (ไม่ส่ง null)
+        # แต่ระบุชื่อไว้ใน "missing" ค่าอื่นที่อ่านได้ยังส่งตามปกติ
+        missing = [name for name, value in values.items() if value is None]
+        payload = {key: value for key, value in data.items() if key not in missing}
+        if missing:
+            payload["missing"] = missing
+            print(f"[WARN] ไม่มีค่าล่าสุดจาก {', '.join(missing)} ส่งเฉพาะค่าที่มี")
+        if len(missing) < len(values):
+            try:
+                r = requests.post(SERVER_URL, json=payload, timeout=3)
+                if r.status_code == 200:
+                    print(f"[OK] ส่งข้อมูลสำเร็จ -> {payload}")
+                else:
+                    print(f"[WARN] ส่งข้อมูลไม่สำเร็จ: {r.status_code} {r.text}")
+            except Exception as e:
+                print(f"[ERROR] ส่งข้อมูลไม่สำเร็จ: {e}")
+
+        cycle += 1
+        if cycle % STATS_EVERY == 0:
+            for name, st in sensors.stats().items():
+                print(f"[STATS] {name}: อ่าน {st['reads']} ครั้ง, ล้มเหลว {st['failures']} ครั้ง, "
+                      f"latency เฉลี่ย {st['avg_latency_ms']} ms (สูงสุด {st['max_latency_ms']} ms)"
+                      + (f", error ล่าสุด: {st['last_error']}" if st["last_error"] else ""))
 
-        time.sleep(5)  # ส่งทุกๆ 5 วินาที
+        time.sleep(SEND_INTERVAL)  # ส่งทุกๆ 5 วินาที
 
 except KeyboardInterrupt:
     print("\nหยุดการวัดเซนเซอร์แล้ว")
+finally:
+    sensors.stop()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+โหลดส่วนที่หนัก (cv2, GPIO ฯลฯ) แบบ lazy ให้ controller.py เริ่มถามงานได้ทันทีหลัง boot
+
+    startup = Startup()
+    startup.register("cv2", lambda: importlib.import_module("cv2"))
+    startup.preload("cv2")          # เริ่มโหลดใน thread เบื้องหลัง
+    cv2 = startup.get("cv2")        # ใช้ตอนต้องการจริง (ถ้ายังโหลดไม่เสร็จจะรอ)
+
+สถานะรวม (state) ที่รายงานไป cloud ผ่าน heartbeat:
+    starting  ยังไม่เรียก mark_polling()
+    warming   ถามงานได้แล้ว แต่ยังโหลดบางส่วนไม่เสร็จ
+    ready     โหลดครบทุกส่วน
+    degraded  บางส่วนโหลดไม่สำเร็จ (จะลองใหม่ตอนเรียก get())
+"""
+
+import threading
+import time
+
+
+class Startup:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.loaders = {}
+        self.values = {}
+        self.components = {}   # ชื่อ -> {"state", "seconds", "error"}
+        self.phases = {}       # ช่วงเวลาตอนเริ่มโปรแกรม (วินาที)
+        self.polling = False
+        self._loading = {}     # ชื่อ -> threading.Event ของการโหลดที่กำลังทำอยู่
+
+    def register(self, name, loader):
+        """loader: callable ไม่มี argument คืนค่าที่จะใช้ (เช่น module)"""
+        self.loaders[name] = loader
+        self.components[name] = {"state": "pending"}
+
+    def record(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] = round(self.phases.get(phase, 0.0) + seconds, 3)
+
+    def mark_polling(self):
+        """เรียกเมื่อพร้อมถามงานจาก cloud แล้ว"""
+        with self.lock:
+            if not self.polling:
+                self.polling = True
+                self.phases["time_to_poll"] = round(time.monotonic() - self.started, 3)
+
+    def is_loaded(self, name):
+        return name in self.values
+
+    def get(self, name):
+        """คืนค่าของส่วนนั้น โหลดครั้งแรกที่เรียก (thread อื่นที่เรียกพร้อมกันจะรอผลเดียวกัน)"""
+        while True:
+            with self.lock:
+                if name in self.values:
+                    return self.values[name]
+                event = self._loading.get(name)
+                if event is None:
+                    event = self._loading[name] = threading.Event()
+                    self.components[name] = {"state": "loading"}
+                    break
+            event.wait()
+            with self.lock:
+                if name not in self.values and self.components[name]["state"] == "failed":
+                    raise RuntimeError(f"โหลด {name} ไม่สำเร็จ: {self.components[name]['error']}")
+
+        start = time.monotonic()
+        try:
+            value = self.loaders[name]()
+        except Exception as e:
+            with self.lock:
+                self.components[name] = {"state": "failed", "error": str(e)}
+                del self._loading[name]
+            event.set()
+            raise
+
+        seconds = time.monotonic() - start
+        with self.lock:
+            self.values[name] = value
+            self.components[name] = {"state": "ready", "seconds": round(seconds, 3)}
+            self.phases[f"load_{name}"] = round(seconds, 3)
+            if all(c["state"] == "ready" for c in self.components.values()):
+                self.phases.setdefault("time_to_ready", round(time.monotonic() - self.started, 3))
+            del self._loading[name]
+        event.set()
+        return value
+
+    def preload(self, *names):
+        """โหลดตามลำดับใน daemon thread (error ถูกเก็บใน components ไม่หยุดโปรแกรม)"""
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=run, name="startup-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def state(self):
+        with self.lock:
+            states = [c["state"] for c in self.components.values()]
+            polling = self.polling
+        if not polling:
+            return "starting"
+        if "failed" in states:
+            return "degraded"
+        if all(s == "ready" for s in states):
+            return "ready"
+        return "warming"
+
+    def report(self):
+        """dict สำหรับส่งไปกับ heartbeat"""
+        state = self.state()
+        with self.lock:
+            return {
+                "state": state,
+                "uptime": round(time.monotonic() - self.started, 1),
+                "phases": dict(self.phases),
+                "components": {name: dict(info) for name, info in self.components.items()}
+            }
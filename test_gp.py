@@ -4,7 +4,7 @@ import time
 import os
 import json
 from datetime import datetime
-import RPi.GPIO as GPIO
+import hardware
 
 # === CONFIG ===
 POND_ID = 1  # <<< ตั้งค่าหมายเลขบ่อ
@@ -30,6 +30,7 @@ def log(msg):
     print(f"[{timestamp}] {msg}")
 
 # === SETUP GPIO ===
+GPIO = hardware.load_gpio()
 GPIO.setmode(GPIO.BCM)
 GPIO.setwarnings(False)
 GPIO.setup(LIMIT_SWITCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
@@ -40,14 +41,7 @@ GPIO.setup(relay_pin, GPIO.OUT)
 GPIO.output(relay_pin, GPIO.HIGH)
 DISTANCE_LIMIT = 30.0  # cm (ตั้งตามที่ต้องการ)
 
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-channel = AnalogIn(ads, ADS.P0)
+channel, = hardware.load_adc_channels(0)
 
 # === MOTOR CONTROL FUNCTIONS ===
 def pull_down():
@@ -89,7 +83,7 @@ log(f"✅ ยกยอขึ้นเสร็จ (ใช้เวลา {durati
 GPIO.output(relay_pin, GPIO.LOW)
 time.sleep(3) 
 log("📷 เตรียมกล้อง...")
-cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
+cap = hardware.open_video_capture(0, cv2.CAP_V4L2)
 if not cap.isOpened():
     log("❌ ไม่สามารถเปิดกล้องได้")
     raise RuntimeError("เปิดกล้องไม่ได้")